@@ -1,32 +1,22 @@
-import os
 import sys
-import hashlib
 import datetime
-import subprocess
 import tkinter as tk
 from tkinter import messagebox
 from tkinter.ttk import Combobox, Style, Progressbar
-from PIL import Image, ImageDraw, ImageFont, ImageTk
 from tkcalendar import Calendar
-import openpyxl
-import qrcode
-import re
-import shutil
-import platform
-
-# --- CONFIG PATHS --- (same as yours)
-BASE_DIR = os.path.join(os.path.expanduser("~"), "Documents", "id_gen_admin")
-EXCEL_FILE = os.path.join(BASE_DIR, "data_base", "patient_data.xlsx")
-ID_OUTPUT_DIR = os.path.join(BASE_DIR, "gen_id")
-LOGO_FILE = os.path.join(BASE_DIR, "logo", "logo.png")
-LICENSE_DIR = os.path.join(BASE_DIR, "logo", "license")
-CRED_FILE = os.path.join(LICENSE_DIR, "cred.txt")
-ADMIN_FILE = os.path.join(LICENSE_DIR, "admin.txt")
-START_DATE_FILE = os.path.join(LICENSE_DIR, "start_date.txt")
-
-PICTURES_DIR = os.path.join(os.path.expanduser("~"), "Pictures")
-PICTURES_SUBDIR = os.path.join(PICTURES_DIR, "GKNMH_ID_Generator")
-PICTURES_EXCEL = os.path.join(PICTURES_SUBDIR, "patient_data_pictures.xlsx")
+from concurrent.futures import ThreadPoolExecutor
+from gknmh_idgen.config import EXCEL_FILE, PICTURES_EXCEL, GENDER_OPTIONS, CARD_SIZE
+from gknmh_idgen import (log_user_status, hash_password, is_strong_password, read_credentials, is_user_password_expired,
+                         save_credentials, read_admin_hash, write_admin_hash, is_expired, calculate_age, validate_date,
+                         patient_field_errors, export_ledger_to_excel, setup_dirs_and_files, register_patient,
+                         command_line_main, get_recent_cards, reprint_patient_card, find_duplicate_patients)
+from gknmh_gui import (LivePreview, print_queue_panel, export_cards_dialog, open_card_file, recent_cards_dialog,
+                       find_patient_dialog, duplicate_patient_dialog, SUBMIT_POLL_MS)
+
+
+# The preview card is drawn natively at this fraction of print size, as large as fits the 930x1290 preview area
+PREVIEW_SCALE = min(930 / CARD_SIZE[0], 1290 / CARD_SIZE[1])
+
 
 # --- FORM WIDGETS ---
 name_entry = None
@@ -36,6 +26,13 @@ care_of_entry = None
 phone_entry = None
 calendar_widget = None
 age_var = None
+btn_generate = None
+submit_progress = None
+submit_status_var = None
+
+_submit_executor = ThreadPoolExecutor(max_workers=1)
+_submit_job = {"future": None, "fields": None}
+
 
 # Style constants for interactive input boxes
 FOCUS_BG = "#e6f0ff"
@@ -108,13 +105,6 @@ class InteractiveEntry(tk.Entry):
 # Your original helper functions, unchanged, except color update on errors in submit_form
 
 
-def log_user_status(user_type, status):
-    os.makedirs(LICENSE_DIR, exist_ok=True)
-    log_file = os.path.join(LICENSE_DIR, "user_login_log.txt")
-    with open(log_file, "a") as f:
-        f.write(f"{datetime.datetime.now().isoformat()} | {user_type} login status: {status}\n")
-
-
 def password_dialog(title, prompt, require_confirm=False, parent=None):
     pw = [None]
     dlg = tk.Toplevel(parent)
@@ -166,82 +156,6 @@ def password_dialog(title, prompt, require_confirm=False, parent=None):
     return pw[0]
 
 
-def hash_password(pw):
-    return hashlib.sha256(pw.encode()).hexdigest()
-
-
-def is_strong_password(pw):
-    return (len(pw) >= 8 and re.search(r"[A-Z]", pw) and re.search(r"[a-z]", pw)
-            and re.search(r"[0-9]", pw) and re.search(r"[!@#$%^&*(),.?\":{}|<>]", pw))
-
-
-def setup_dirs_and_files():
-    os.makedirs(os.path.join(BASE_DIR, "data_base"), exist_ok=True)
-    os.makedirs(ID_OUTPUT_DIR, exist_ok=True)
-    os.makedirs(LICENSE_DIR, exist_ok=True)
-    os.makedirs(os.path.dirname(LOGO_FILE), exist_ok=True)
-    os.makedirs(PICTURES_SUBDIR, exist_ok=True)
-    if not os.path.exists(PICTURES_EXCEL):
-        wb_pic = openpyxl.Workbook()
-        ws_pic = wb_pic.active
-        ws_pic.title = "Patient Data Pictures"
-        ws_pic.append(["Patient ID", "Name", "DOB", "Age", "Gender", "Care Of", "Phone", "Registration Date", "Timestamp"])
-        wb_pic.save(PICTURES_EXCEL)
-    if not os.path.exists(EXCEL_FILE):
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.append(["Patient ID", "Name", "DOB", "Age", "Gender", "Care Of", "Phone", "QR Path", "Reg Date", "Timestamp"])
-        wb.save(EXCEL_FILE)
-    if not os.path.exists(LOGO_FILE):
-        Image.new("RGB", (600, 200), "gray").save(LOGO_FILE)
-    if not os.path.exists(ADMIN_FILE):
-        with open(ADMIN_FILE, "w") as f:
-            f.write(hash_password("Admin@123"))
-    if not os.path.exists(START_DATE_FILE):
-        with open(START_DATE_FILE, "w") as f:
-            f.write(datetime.datetime.today().strftime("%d-%m-%Y"))
-    if os.name == 'nt':
-        subprocess.call(["attrib", "+h", BASE_DIR])
-
-
-def read_credentials():
-    if not os.path.exists(CRED_FILE):
-        return None, None, 0
-    with open(CRED_FILE) as f:
-        lines = f.readlines()
-    if len(lines) < 3:
-        return None, None, 0
-    return lines[0].strip(), lines[1].strip(), int(lines[2].strip())
-
-
-def is_user_password_expired():
-    _, timestamp, _ = read_credentials()
-    if not timestamp:
-        return True
-    try:
-        last_set = datetime.datetime.fromisoformat(timestamp)
-        return (datetime.datetime.now() - last_set).days > 90
-    except:
-        return True
-
-
-def save_credentials(user_hash, timestamp, attempts=0):
-    with open(CRED_FILE, "w") as f:
-        f.write(f"{user_hash}\n{timestamp}\n{attempts}")
-
-
-def read_admin_hash():
-    if not os.path.exists(ADMIN_FILE):
-        return ""
-    with open(ADMIN_FILE) as f:
-        return f.read().strip()
-
-
-def write_admin_hash(new_hash):
-    with open(ADMIN_FILE, "w") as f:
-        f.write(new_hash)
-
-
 def set_new_user_password(require_admin_auth=False, parent=None):
     if require_admin_auth:
         admin_pw = password_dialog("Admin Confirmation", "Enter Admin Password:", parent=parent)
@@ -400,161 +314,12 @@ def choose_user_type_and_login(root):
     login_window.mainloop()
 
 
-def get_start_date():
-    with open(START_DATE_FILE) as file:
-        return datetime.datetime.strptime(file.read().strip(), "%d-%m-%Y")
-
-
 def check_expiry(parent=None):
-    if datetime.datetime.today() > get_start_date() + datetime.timedelta(days=300):
+    if is_expired():
         messagebox.showerror("Error", "The ID generator has expired. Please contact support.", parent=parent)
         sys.exit()
 
 
-def generate_patient_id():
-    prefix = 'GKNMH-CERWP-'
-    wb = openpyxl.load_workbook(EXCEL_FILE)
-    sheet = wb.active
-    existing_ids = [row[0].value for row in sheet.iter_rows(min_row=2, max_col=1)]
-    num = 1000
-    while f"{prefix}{num}" in existing_ids:
-        num += 1
-    return f"{prefix}{num}"
-
-
-def calculate_age(dob_str, reference_str):
-    try:
-        dob = datetime.datetime.strptime(dob_str, "%d-%m-%Y")
-        ref = datetime.datetime.strptime(reference_str, "%d-%m-%Y")
-        return ref.year - dob.year - ((ref.month, ref.day) < (dob.month, dob.day))
-    except:
-        return ""
-
-
-def validate_date(date_text):
-    try:
-        d = datetime.datetime.strptime(date_text, "%d-%m-%Y")
-        return d <= datetime.datetime.today()
-    except:
-        return False
-
-
-def generate_qr_code(data, qr_filename):
-    qr = qrcode.QRCode(version=1, box_size=12, border=6)
-    qr.add_data(data)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
-    datas = qr_img.getdata()
-    new_data = [(255, 255, 255, 0) if item[:3] == (255, 255, 255) else item for item in datas]
-    qr_img.putdata(new_data)
-    qr_img.save(qr_filename)
-
-
-def create_patient_id_card(info, qr_filename, output_filename):
-    try:
-        font = ImageFont.truetype("arial.ttf", 30)
-        title_font = ImageFont.truetype("arial.ttf", 36)
-        id_font = ImageFont.truetype("arialbd.ttf", 48)
-    except:
-        font = ImageFont.load_default()
-        title_font = ImageFont.load_default()
-        id_font = ImageFont.load_default()
-    w, h = 1240, 1748
-    margin = 50
-    card = Image.new("RGB", (w, h), "white")
-    draw = ImageDraw.Draw(card)
-
-    # Outer border thick black
-    draw.rectangle([margin, margin, w - margin, h - margin], outline="black", width=5)
-
-    # Logo row
-    if os.path.exists(LOGO_FILE):
-        logo = Image.open(LOGO_FILE).resize((w - 2 * margin, 200))
-        card.paste(logo, (margin, margin))
-
-    # Title "Patient ID Card"
-    draw.text(((w - draw.textlength("Patient ID Card", title_font)) // 2, margin + 210), "Patient ID Card",
-              font=title_font, fill="red")
-
-    # Patient ID big and centered
-    draw.text(((w - draw.textlength(info["id"], id_font)) // 2, margin + 270), info["id"], font=id_font, fill="blue")
-
-    # Details start coordinates
-    x_label = margin + 60
-    x_colon = x_label + 300
-    x_value = x_colon + 20
-    y_start = margin + 400
-    y_gap = 70
-    details = [
-        ("Patient Name", info["name"]),
-        ("Date of Birth", info["dob"]),
-        ("Age", f"{info['age']} years"),
-        ("Gender", info["gender"]),
-        ("Care Of", info["care_of"]),
-        ("Phone No", info["phone"]),
-        ("Registration Date", info["registration_date"])
-    ]
-    for idx, (label, value) in enumerate(details):
-        y = y_start + idx * y_gap
-        draw.text((x_label, y), label, font=font, fill="black")
-        draw.text((x_colon, y), ":", font=font, fill="black")
-        draw.text((x_value, y), value, font=font, fill="black")
-
-    # QR code
-    qr = Image.open(qr_filename).resize((400, 400))
-    card.paste(qr, (w - 400 - margin, y_start), qr)
-
-    # Footer measurement text
-    draw.text((x_label, h - 700), "BP: ________ mm/Hg     Pulse: ______/min", font=font, fill="black")
-    draw.text((x_label, h - 600), "Blood Sugar: FBS/RBS ________ mgs/dl", font=font, fill="black")
-    draw.text((x_label, h - 500), "Oral:", font=font, fill="black")
-    card.save(output_filename, dpi=(300, 300))
-
-
-def write_to_excel(info, qr_path):
-    wb = openpyxl.load_workbook(EXCEL_FILE)
-    sheet = wb.active
-    timestamp = datetime.datetime.now().isoformat()
-    sheet.append([
-        info["id"], info["name"], info["dob"], info["age"], info["gender"],
-        info["care_of"], info["phone"], qr_path, info["registration_date"], timestamp
-    ])
-    wb.save(EXCEL_FILE)
-
-
-def write_to_pictures_excel(info):
-    wb = openpyxl.load_workbook(PICTURES_EXCEL)
-    sheet = wb.active
-    timestamp = datetime.datetime.now().isoformat()
-    sheet.append([
-        info["id"], info["name"], info["dob"], info["age"], info["gender"],
-        info["care_of"], info["phone"], info["registration_date"], timestamp
-    ])
-    wb.save(PICTURES_EXCEL)
-
-
-def open_image_default_viewer(image_path):
-    try:
-        if platform.system() == "Windows":
-            os.startfile(image_path)
-        elif platform.system() == "Darwin":
-            subprocess.call(["open", image_path])
-        else:
-            subprocess.call(["xdg-open", image_path])
-    except Exception as e:
-        print(f"Failed to open image: {e}")
-
-
-def print_image_default(image_path):
-    try:
-        if platform.system() == "Windows":
-            os.startfile(image_path, "print")
-        else:
-            subprocess.call(["lp", image_path])
-    except Exception as e:
-        print(f"Failed to print image: {e}")
-
-
 def reset_form():
     global name_entry, dob_entry, gender_combobox, care_of_entry, phone_entry, calendar_widget, age_var
     if name_entry:
@@ -578,70 +343,93 @@ def reset_form():
         age_var.set("")
 
 
+def form_values():
+    return (name_entry.get().strip(), dob_entry.get().strip(), gender_combobox.get().strip(),
+            care_of_entry.get().strip(), phone_entry.get().strip())
+
+
 def submit_form():
     global name_entry, dob_entry, gender_combobox, care_of_entry, phone_entry, calendar_widget, age_var
+    if _submit_job["future"] is not None:
+        return  # a registration is already in flight
     check_expiry()
     # Clear previous errors
     for ctl in [name_entry, dob_entry, care_of_entry, phone_entry]:
         ctl.mark_error(False)
     gender_combobox.config(background="white")
 
-    name = name_entry.get().strip()
-    dob = dob_entry.get().strip()
-    gender = gender_combobox.get().strip()
-    care_of = care_of_entry.get().strip()
-    phone = phone_entry.get().strip()
+    name, dob, gender, care_of, phone = form_values()
 
-    error_found = False
     # Validation with error highlight & message
-    if not name:
+    errors = patient_field_errors(name, dob, gender, phone)
+    if "name" in errors:
         name_entry.mark_error(True)
-        error_found = True
-
-    if not dob or not validate_date(dob):
+    if "dob" in errors:
         dob_entry.mark_error(True)
-        error_found = True
-
-    if not gender:
+    if "gender" in errors:
         gender_combobox.config(background=ERROR_BORDER_COLOR)
-        error_found = True
-
-    if not phone.isdigit() or len(phone) != 10:
+    if "phone" in errors:
         phone_entry.mark_error(True)
-        error_found = True
 
-    if error_found:
+    if errors:
         messagebox.showerror("Error", "Please fix the highlighted fields before submitting.")
         return
 
-    age = calculate_age(dob, datetime.datetime.today().strftime("%d-%m-%Y"))
-    patient_id = generate_patient_id()
-    reg_date = datetime.datetime.today().strftime("%d-%m-%Y")
-    qr_filename = os.path.join(ID_OUTPUT_DIR, f"{patient_id}_qr.png")
-    generate_qr_code(patient_id, qr_filename)
-    output_filename = os.path.join(ID_OUTPUT_DIR, f"{patient_id}.png")
-    patient_info = {
-        "id": patient_id, "name": name, "dob": dob, "age": age,
-        "gender": gender, "care_of": care_of, "phone": phone,
-        "registration_date": reg_date
-    }
-    create_patient_id_card(patient_info, qr_filename, output_filename)
-    write_to_excel(patient_info, qr_filename)
+    # Same phone or name with the same date of birth: offer the existing record before a new ID is issued
     try:
-        shutil.copy(output_filename, PICTURES_SUBDIR)
+        duplicates = find_duplicate_patients(name, dob, phone)
     except Exception as e:
-        print(f"Failed copying to Pictures folder: {e}")
-    write_to_pictures_excel(patient_info)
-    print_image_default(output_filename)
-    reset_form()
+        print(f"Duplicate check failed: {e}")
+        duplicates = []
+    if duplicates:
+        action, patient = duplicate_patient_dialog(name, duplicates, parent=btn_generate.winfo_toplevel())
+        if action is None:
+            return
+        if action == "reprint":
+            try:
+                reprint_patient_card(patient)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not reprint the card of {patient['id']}: {e}")
+                return
+            submit_status_var.set(f"Reprinted existing card {patient['id']} for {patient['name']}")
+            reset_form()
+            return
+
+    # ID allocation, rendering, ledger and printing run on the worker; poll_submit() picks up the result
+    btn_generate.config(state="disabled", cursor="watch")
+    submit_progress.start(10)
+    submit_status_var.set(f"Generating ID card for {name}...")
+    _submit_job["fields"] = (name, dob, gender, care_of, phone)
+    _submit_job["future"] = _submit_executor.submit(register_patient, name, dob, gender, care_of, phone)
+    btn_generate.after(SUBMIT_POLL_MS, poll_submit)
+
+
+def poll_submit():
+    future = _submit_job["future"]
+    if not future.done():
+        btn_generate.after(SUBMIT_POLL_MS, poll_submit)
+        return
+    _submit_job["future"] = None
+    submit_progress.stop()
+    btn_generate.config(state="normal", cursor="hand2")
     try:
-        os.remove(qr_filename)
-    except:
-        pass
+        patient_info, output_filename, stage_errors = future.result()
+    except Exception as e:
+        submit_status_var.set("")
+        messagebox.showerror("Error", f"Could not generate the ID card: {e}")
+        return
+    submit_status_var.set(f"Generated {patient_info['id']} for {patient_info['name']}")
+    # The form stays editable while the job runs: keep whatever the operator has started typing for the next patient
+    if form_values() == _submit_job["fields"]:
+        reset_form()
+    if stage_errors:
+        details = "\n".join(f"{stage}: {error}" for stage, error in stage_errors.items())
+        messagebox.showwarning("Registration Incomplete", f"{patient_info['id']} was issued, but some steps failed:\n{details}")
 
 
 def start_gui(root):
     global name_entry, dob_entry, gender_combobox, care_of_entry, phone_entry, calendar_widget, age_var
+    global btn_generate, submit_progress, submit_status_var
 
     app = tk.Toplevel(root)
     app.title("Patient ID Generator")
@@ -685,7 +473,7 @@ def start_gui(root):
 
     tk.Label(form_frame, text="Gender:", anchor="w", width=20, font=("Segoe UI", 12, "bold"),
              bg="#f8f9fa", fg="#0078d7").grid(row=4, column=0, sticky="w", pady=7)
-    gender_combobox = Combobox(form_frame, values=["Male", "Female", "Other"], state="readonly", width=28,
+    gender_combobox = Combobox(form_frame, values=GENDER_OPTIONS, state="readonly", width=28,
                                font=("Segoe UI", 12))
     gender_combobox.grid(row=4, column=1, pady=7, padx=5)
     ToolTip(gender_combobox, "Select patient's gender")
@@ -706,27 +494,66 @@ def start_gui(root):
     btn_generate = tk.Button(form_frame, text="Generate ID Card", width=32, command=submit_form,
                              bg="#0078d7", fg="white", activebackground="#005a9e", relief="raised", cursor="hand2",
                              font=("Segoe UI", 12, "bold"))
-    btn_generate.grid(row=7, column=0, columnspan=2, pady=20, padx=5)
+    btn_generate.grid(row=7, column=0, columnspan=2, pady=(20, 5), padx=5)
+
+    # Progress of the registration running in the background
+    submit_frame = tk.Frame(form_frame, bg="#f8f9fa")
+    submit_frame.grid(row=8, column=0, columnspan=2, pady=(0, 10), padx=5)
+    submit_progress = Progressbar(submit_frame, mode="indeterminate", length=300)
+    submit_progress.pack()
+    submit_status_var = tk.StringVar()
+    tk.Label(submit_frame, textvariable=submit_status_var, font=("Segoe UI", 10), bg="#f8f9fa", fg="#555").pack()
 
     # Preview button
     def preview_last_id():
-        latest_files = sorted([f for f in os.listdir(ID_OUTPUT_DIR) if f.endswith(".png") and not f.startswith("preview_")],
-                              key=lambda x: os.path.getmtime(os.path.join(ID_OUTPUT_DIR, x)), reverse=True)
-        if latest_files:
-            open_image_default_viewer(os.path.join(ID_OUTPUT_DIR, latest_files[0]))
+        latest = get_recent_cards().latest()
+        if latest:
+            open_card_file(latest, parent=app)
         else:
             messagebox.showwarning("No Preview", "No ID card has been generated yet.", parent=app)
 
     btn_preview = tk.Button(form_frame, text="Preview Last ID Card", width=32, command=preview_last_id,
                             bg="#555", fg="white", activebackground="#333", relief="raised", cursor="hand2",
                             font=("Segoe UI", 11))
-    btn_preview.grid(row=8, column=0, columnspan=2, pady=5, padx=5)
+    btn_preview.grid(row=9, column=0, columnspan=2, pady=5, padx=5)
+
+    btn_recent = tk.Button(form_frame, text="Recent ID Cards", width=32, command=lambda: recent_cards_dialog(app),
+                           bg="#555", fg="white", activebackground="#333", relief="raised", cursor="hand2",
+                           font=("Segoe UI", 11))
+    btn_recent.grid(row=10, column=0, columnspan=2, pady=5, padx=5)
+
+    btn_find = tk.Button(form_frame, text="Find Returning Patient", width=32, command=lambda: find_patient_dialog(app),
+                         bg="#555", fg="white", activebackground="#333", relief="raised", cursor="hand2",
+                         font=("Segoe UI", 11))
+    btn_find.grid(row=11, column=0, columnspan=2, pady=5, padx=5)
+
+    # Spreadsheets are materialised from the ledger only when someone asks for them
+    def export_excel():
+        try:
+            export_ledger_to_excel()
+        except Exception as e:
+            messagebox.showerror("Export Failed", f"Could not export patient data: {e}", parent=app)
+            return
+        messagebox.showinfo("Export Complete", f"Patient data exported to:\n{EXCEL_FILE}\n{PICTURES_EXCEL}", parent=app)
+
+    btn_export = tk.Button(form_frame, text="Export to Excel", width=32, command=export_excel,
+                           bg="#555", fg="white", activebackground="#333", relief="raised", cursor="hand2",
+                           font=("Segoe UI", 11))
+    btn_export.grid(row=12, column=0, columnspan=2, pady=5, padx=5)
+
+    btn_export_cards = tk.Button(form_frame, text="Export Cards to PDF", width=32,
+                                 command=lambda: export_cards_dialog(app), bg="#555", fg="white",
+                                 activebackground="#333", relief="raised", cursor="hand2", font=("Segoe UI", 11))
+    btn_export_cards.grid(row=13, column=0, columnspan=2, pady=5, padx=5)
+
+    # Print queue: cards print in the background; failed jobs stay queued until retried
+    print_queue_panel(form_frame).grid(row=14, column=0, columnspan=2, pady=5, padx=5)
 
     # Preview toggle
     preview_enabled = tk.BooleanVar(value=True)
     btn_toggle = tk.Checkbutton(form_frame, text="Show Live ID Preview", variable=preview_enabled, bg="#f8f9fa",
                                 font=("Segoe UI", 11))
-    btn_toggle.grid(row=9, column=0, columnspan=2, pady=15, padx=5)
+    btn_toggle.grid(row=15, column=0, columnspan=2, pady=15, padx=5)
 
     # Preview frame with border & shadow look
     preview_frame = tk.Frame(app, relief="groove", bd=3, bg="white")
@@ -737,10 +564,14 @@ def start_gui(root):
 
     preview_canvas = tk.Label(preview_frame, bg="white", width=930, height=1290, relief="ridge", bd=2)
     preview_canvas.pack()
+    preview_timing_label = tk.Label(preview_frame, text="", font=("Segoe UI", 9), fg="#555", bg="white")
+    preview_timing_label.pack(pady=(2, 0))
+    preview_memory_label = tk.Label(preview_frame, text="", font=("Segoe UI", 9), fg="#555", bg="white")
+    preview_memory_label.pack(pady=(0, 5))
 
-    def create_temp_id_card(temp_path):
+    def preview_info():
         # For preview use dummy ID + data with placeholders
-        info = {
+        return {
             "id": "PREVIEW-ID",
             "name": name_entry.get().strip() or ".................",
             "dob": dob_entry.get().strip() or "dd-mm-yyyy",
@@ -750,35 +581,15 @@ def start_gui(root):
             "phone": phone_entry.get().strip() or ".............",
             "registration_date": datetime.datetime.today().strftime("%d-%m-%Y")
         }
-        temp_qr = temp_path.replace(".png", "_qr.png")
-        generate_qr_code(info["id"], temp_qr)
-        create_patient_id_card(info, temp_qr, temp_path)
-        try:
-            os.remove(temp_qr)
-        except:
-            pass
-
-    def update_preview(event=None):
-        if not preview_enabled.get():
-            preview_canvas.config(image="", text="Preview disabled", bg="white", font=("Segoe UI", 14, "italic"))
-            preview_canvas.image = None
-            return
-        temp_preview_path = os.path.join(ID_OUTPUT_DIR, "preview_realtime.png")
-        create_temp_id_card(temp_preview_path)
-        try:
-            img = Image.open(temp_preview_path)
-            img = img.resize((930, 1290), Image.LANCZOS)
-            img_tk = ImageTk.PhotoImage(img)
-            preview_canvas.config(image=img_tk, text="", bg="white")
-            preview_canvas.image = img_tk  # keep ref
-        except Exception as e:
-            preview_canvas.config(text=f"Preview unavailable: {e}", font=("Segoe UI", 12), bg="white")
-            preview_canvas.image = None
-        finally:
-            try:
-                os.remove(temp_preview_path)
-            except:
-                pass
+
+    def show_card(photo):
+        preview_canvas.config(image=photo, text="", bg="white")
+
+    def show_message(text, font):
+        preview_canvas.config(image="", text=text, font=font, bg="white")
+
+    preview = LivePreview(app, PREVIEW_SCALE, preview_info, preview_enabled, show_card, show_message,
+                          preview_timing_label, preview_memory_label)
 
     def sync_dob_field_to_calendar(event=None):
         entered_dob = dob_entry.get().strip()
@@ -792,7 +603,7 @@ def start_gui(root):
                 pass
         else:
             age_var.set("")
-        update_preview()
+        preview.schedule()
 
     def sync_calendar_to_dob_field(event=None):
         selected_date = calendar_widget.get_date()
@@ -803,21 +614,21 @@ def start_gui(root):
             age_var.set(str(age))
         else:
             age_var.set("")
-        update_preview()
+        preview.schedule()
 
     # Bind fields for live preview & sync DOB/calendar
     for widget in [name_entry, dob_entry, care_of_entry, phone_entry]:
-        widget.bind("<KeyRelease>", update_preview)
-        widget.bind("<FocusOut>", update_preview)
+        widget.bind("<KeyRelease>", preview.schedule)
+        widget.bind("<FocusOut>", preview.schedule)
 
-    gender_combobox.bind("<<ComboboxSelected>>", update_preview)
+    gender_combobox.bind("<<ComboboxSelected>>", preview.schedule)
     dob_entry.bind("<FocusOut>", sync_dob_field_to_calendar)
     dob_entry.bind("<KeyRelease>", sync_dob_field_to_calendar)
     calendar_widget.bind("<<CalendarSelected>>", sync_calendar_to_dob_field)
-    btn_toggle.config(command=update_preview)
+    btn_toggle.config(command=preview.update)
 
     sync_dob_field_to_calendar()
-    update_preview()
+    preview.update()
 
     # Grid weight setup for resizing
     app.grid_columnconfigure(0, weight=1, minsize=470)
@@ -829,6 +640,8 @@ def start_gui(root):
 
 if __name__ == "__main__":
     setup_dirs_and_files()
+    if len(sys.argv) > 1:
+        sys.exit(command_line_main(sys.argv[1:]))
     root = tk.Tk()
     root.withdraw()  # Hide the main root window
     choose_user_type_and_login(root)
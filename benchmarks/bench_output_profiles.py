@@ -0,0 +1,37 @@
+import io
+import os
+import sys
+import timeit
+
+# Usage: python benchmarks/bench_output_profiles.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gknmh_idgen.config import OUTPUT_PROFILES, CARD_OUTPUT_PROFILE, PICTURES_OUTPUT_PROFILE, PRINT_OUTPUT_PROFILE
+from gknmh_idgen.cards import generate_qr_code, create_patient_id_card, save_card_image
+
+INFO = {"id": "GKNMH-CERWP-123456", "name": "Lakshmi Narayanan", "dob": "01-01-1980", "age": 45, "gender": "Female",
+        "care_of": "S. Narayanan", "phone": "9876543210", "registration_date": "23-07-2025"}
+ROUNDS = 5
+
+
+def encode(card, profile):
+    buffer = io.BytesIO()
+    save_card_image(card, buffer, profile)
+    return buffer.getbuffer().nbytes
+
+
+def main():
+    card = create_patient_id_card(INFO, generate_qr_code(INFO["id"]))
+    used = {CARD_OUTPUT_PROFILE: "gen_id/", PICTURES_OUTPUT_PROFILE: "Pictures", PRINT_OUTPUT_PROFILE: "printer"}
+    print(f"card: {card.size[0]}x{card.size[1]} {card.mode}")
+    print(f"{'profile':<15} {'format':<6} {'mode':<5} {'ms/card':>9} {'KB/card':>9}  used for")
+    for name, (image_format, _, mode, _) in OUTPUT_PROFILES.items():
+        size = encode(card, name)
+        seconds = min(timeit.repeat(lambda: encode(card, name), number=ROUNDS, repeat=3)) / ROUNDS
+        print(f"{name:<15} {image_format:<6} {mode or card.mode:<5} {seconds * 1000:9.1f} {size / 1024:9.1f}  "
+              f"{used.get(name, '')}")
+
+
+if __name__ == "__main__":
+    main()
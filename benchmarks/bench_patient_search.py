@@ -0,0 +1,51 @@
+import os
+import sys
+import random
+import tempfile
+import timeit
+from contextlib import closing
+
+# Usage: python benchmarks/bench_patient_search.py [patients]
+# Builds a throwaway ledger under a temporary home directory, so the real one is never touched
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["HOME"] = os.environ["USERPROFILE"] = tempfile.mkdtemp(prefix="gknmh_bench_")
+
+from gknmh_idgen.config import ID_PREFIX, LEDGER_DB
+from gknmh_idgen.ledger import open_ledger, insert_ledger_rows
+from gknmh_idgen.search import search_patients
+
+FIRST_NAMES = ["Ravi", "Lakshmi", "Priya", "Arun", "Meena", "Suresh", "Kavitha", "Ramesh", "Anitha", "Karthik",
+               "Divya", "Senthil", "Revathi", "Vijay", "Geetha", "Murugan", "Saranya", "Ganesh", "Deepa", "Prakash"]
+LAST_NAMES = ["Kumar", "Narayanan", "Subramanian", "Raman", "Krishnan", "Pillai", "Iyer", "Reddy", "Nair", "Rajan",
+              "Sundaram", "Venkatesh", "Balaji", "Mohan", "Chandran", "Ganesan", "Srinivasan", "Selvam", "Devi", "Babu"]
+QUERIES = ["GKNMH-CERWP-51234", "51234", "98765", "9876543", "ravi", "lakshmi nara", "kum ra", "Subramanain", "zzz"]
+ROUNDS = 20
+
+
+def build_ledger(count):
+    rng = random.Random(1)
+    rows = []
+    for n in range(1000, 1000 + count):
+        name = f"{rng.choice(FIRST_NAMES)}{rng.randint(0, 99) or ''} {rng.choice(LAST_NAMES)}"
+        dob = f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(1940, 2020)}"
+        rows.append((f"{ID_PREFIX}{n}", name, dob, 30, "Male", "", f"9{rng.randint(0, 999999999):09d}", "",
+                     "01-01-2025", "2025-01-01", "2025-01-01T10:00:00"))
+    with closing(open_ledger()) as conn, conn:
+        insert_ledger_rows(conn, rows)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    os.makedirs(os.path.dirname(LEDGER_DB), exist_ok=True)
+    build_ledger(count)
+    print(f"{count} patients, ledger {os.path.getsize(LEDGER_DB) / 1e6:.1f} MB")
+    for query in QUERIES:
+        results = search_patients(query)
+        seconds = min(timeit.repeat(lambda: search_patients(query), number=ROUNDS, repeat=3)) / ROUNDS
+        kinds = sorted({r["match"] for r in results})
+        print(f"{query!r:<22} {seconds * 1000:7.2f} ms  {len(results):3d} results  {', '.join(kinds)}")
+
+
+if __name__ == "__main__":
+    main()
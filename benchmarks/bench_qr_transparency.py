@@ -0,0 +1,44 @@
+import os
+import sys
+import timeit
+
+import qrcode
+
+# Usage: python benchmarks/bench_qr_transparency.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gknmh_idgen.cards import generate_qr_code
+
+PAYLOAD = "GKNMH-CERWP-123456"
+ROUNDS = 50
+
+
+def legacy_generate_qr_code(data):
+    # The per-pixel loop generate_qr_code() used before the transparency mask was vectorized
+    qr = qrcode.QRCode(version=1, box_size=12, border=6)
+    qr.add_data(data)
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
+    datas = qr_img.getdata()
+    new_data = [(255, 255, 255, 0) if item[:3] == (255, 255, 255) else item for item in datas]
+    qr_img.putdata(new_data)
+    return qr_img
+
+
+def main():
+    legacy = legacy_generate_qr_code(PAYLOAD)
+    # Ask for the legacy 12px-per-module size so the two outputs are comparable pixel for pixel
+    current = generate_qr_code(PAYLOAD, size=legacy.width)
+    assert legacy.size == current.size and legacy.tobytes() == current.tobytes(), "QR output differs from legacy loop"
+
+    legacy_s = min(timeit.repeat(lambda: legacy_generate_qr_code(PAYLOAD), number=ROUNDS, repeat=3)) / ROUNDS
+    current_s = min(timeit.repeat(lambda: generate_qr_code(PAYLOAD, size=legacy.width), number=ROUNDS, repeat=3)) / ROUNDS
+    print(f"QR size: {current.size[0]}x{current.size[1]} ({current.size[0] * current.size[1]} pixels)")
+    print(f"per-pixel loop : {legacy_s * 1000:8.2f} ms/QR")
+    print(f"vectorized mask: {current_s * 1000:8.2f} ms/QR")
+    print(f"speedup        : {legacy_s / current_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+# Tk dialogs and widgets shared by both frontends: the live card preview, the print queue panel, card export,
+# recent cards and the returning-patient lookup. The scripts only lay out the registration form around them.
+import os
+import time
+import datetime
+import threading
+import tkinter as tk
+from tkinter import messagebox, filedialog
+from tkinter.ttk import Combobox, Progressbar
+from PIL import ImageTk
+from gknmh_idgen.config import SHEET_LAYOUTS
+from gknmh_idgen import (open_image_default_viewer, get_print_spooler, export_cards_to_pdf, get_recent_cards,
+                         find_card_file, search_patients, patient_card_file, reprint_patient_card, CardPreview,
+                         peak_memory_bytes, get_qr_cache)
+
+
+# Live preview: keystrokes are coalesced for this long before a frame is rendered off the Tk thread
+PREVIEW_DEBOUNCE_MS = 120
+PREVIEW_POLL_MS = 15
+PREVIEW_FRAME_BUDGET_MS = 50
+# Background jobs (registration, card export) are checked on this often from the Tk thread
+SUBMIT_POLL_MS = 50
+PRINT_STATUS_POLL_MS = 1000
+# Patient search runs this long after the last keystroke in the Find Returning Patient box
+SEARCH_DEBOUNCE_MS = 150
+
+
+class LivePreview:
+    # Renders the card for the current form in memory on a worker thread; the Tk thread only snapshots the form and
+    # shows the result. Edits made while a frame is rendering mark the preview dirty, so only the latest form state
+    # gets drawn next, and a keystroke redraws only the rows whose text changed.
+    # show_image(photo) and show_text(text, font) put the card or a message on the frontend's own widget.
+    def __init__(self, app, scale, read_info, enabled, show_image, show_text, timing_label, memory_label):
+        self.app = app
+        self.read_info = read_info
+        self.enabled = enabled
+        self.show_image = show_image
+        self.show_text = show_text
+        self.timing_label = timing_label
+        self.memory_label = memory_label
+        self.renderer = CardPreview(scale)
+        self.after_id = None
+        self.busy = False
+        self.dirty = False
+        self.result = None
+        # Two PhotoImages for the preview's whole life: the card on screen and a scratch image that changed rows
+        # pass through. Frames are pasted into them in place; they are only replaced if the frame size changes.
+        self.photos = {"card": None, "rows": None}
+        self.on_screen = None
+        self.stats = {"frames": 0, "photos": 0}
+
+    def schedule(self, event=None):
+        if self.after_id is not None:
+            self.app.after_cancel(self.after_id)
+        self.after_id = self.app.after(PREVIEW_DEBOUNCE_MS, self.update)
+
+    def update(self, event=None):
+        self.after_id = None
+        if not self.enabled.get():
+            self.clear("Preview disabled", ("Segoe UI", 14, "italic"))
+            return
+        if self.busy:
+            self.dirty = True
+            return
+        self.busy = True
+        threading.Thread(target=self._render, args=(self.read_info(),), daemon=True).start()
+        self.app.after(PREVIEW_POLL_MS, self._poll)
+
+    def clear(self, text, font):
+        self.show_text(text, font)
+        self.on_screen = None
+        if not self.busy:
+            self.renderer.reset()  # nothing on screen to patch; _poll() handles a render in flight
+
+    def _render(self, info):
+        start = time.perf_counter()
+        try:
+            frame, boxes = self.renderer.update(info)
+            if boxes == [(0, 0) + frame.size]:
+                update = (frame, [])
+            else:
+                # Only the changed rows travel to the Tk thread, each as its own small image
+                update = (None, [(box[:2], frame.crop(box)) for box in boxes])
+            self.result = (update, None, (time.perf_counter() - start) * 1000)
+        except Exception as e:
+            self.renderer.reset()
+            self.result = (None, e, 0)
+
+    def _poll(self):
+        result = self.result
+        if result is None:
+            self.app.after(PREVIEW_POLL_MS, self._poll)
+            return
+        self.result = None
+        self.busy = False
+        update, error, elapsed_ms = result
+        if not self.enabled.get():
+            self.renderer.reset()  # nothing stays on screen for the next frame to patch
+            return
+        if error is None and update[0] is None and self.on_screen is None:
+            # Rows rendered against a frame that was cleared in the meantime: draw the whole card again
+            self.renderer.reset()
+            self.update()
+            return
+        if error is None:
+            self._show_update(*update)
+            rows = "whole card" if update[0] is not None else f"{len(update[1])} row(s)"
+            self.timing_label.config(text=f"Preview frame: {elapsed_ms:.0f} ms ({rows})",
+                                     fg="#555" if elapsed_ms <= PREVIEW_FRAME_BUDGET_MS else "#b22222")
+        else:
+            self.clear(f"Preview unavailable: {error}", ("Segoe UI", 12))
+        if self.dirty:
+            self.dirty = False
+            self.update()
+
+    def _photo(self, name, size):
+        photo = self.photos[name]
+        if photo is None or (photo.width(), photo.height()) != size:
+            photo = self.photos[name] = ImageTk.PhotoImage("RGB", size, width=size[0], height=size[1])
+            self.stats["photos"] += 1
+        return photo
+
+    def _show_update(self, frame, patches):
+        # A whole new frame is pasted over the card image; a changed row is pasted into the scratch image and
+        # copied from there onto the card (Tk "image copy -from ... -to")
+        if frame is not None:
+            card_photo = self._photo("card", frame.size)
+            card_photo.paste(frame)
+            self.show_image(card_photo)
+            self.on_screen = card_photo
+        card_photo = self.on_screen
+        for (x, y), patch in patches:
+            rows_photo = self._photo("rows", (card_photo.width(), card_photo.height()))
+            rows_photo.paste(patch)
+            self.app.tk.call(str(card_photo), "copy", str(rows_photo), "-from", 0, 0, patch.width, patch.height,
+                             "-to", x, y)
+        self.stats["frames"] += 1
+        peak = peak_memory_bytes()
+        qr = get_qr_cache().stats()
+        self.memory_label.config(text=f"{self.stats['frames']} frames, {self.stats['photos']} PhotoImages created, "
+                                      f"{len(self.app.image_names())} Tk images alive"
+                                      + (f", peak RSS {peak / 2 ** 20:.0f} MB" if peak else "")
+                                      + f"; QR cache {qr['hits']} hits / {qr['misses']} misses, "
+                                        f"{qr['bytes'] / 2 ** 20:.1f} of {qr['max_bytes'] / 2 ** 20:.0f} MB")
+
+
+def print_queue_panel(parent):
+    # Status of the background print queue, Retry Failed Prints, and the hold-for-A4-sheets controls.
+    # Returns the panel's frame for the caller to place; it keeps polling the spooler for as long as it exists.
+    app = parent.winfo_toplevel()
+    print_frame = tk.Frame(parent, bg="#f8f9fa")
+    print_status_label = tk.Label(print_frame, text="", font=("Segoe UI", 10), bg="#f8f9fa", fg="#555", wraplength=420)
+    print_status_label.pack()
+    btn_retry_prints = tk.Button(print_frame, text="Retry Failed Prints", width=32, state="disabled",
+                                 command=lambda: get_print_spooler().retry_failed(), bg="#555", fg="white",
+                                 activebackground="#333", relief="raised", cursor="hand2", font=("Segoe UI", 11))
+    btn_retry_prints.pack(pady=(4, 0))
+    print_state = {"failed": 0}
+
+    # Sheet printing: cards are held and later printed together, several to an A4 page
+    hold_var = tk.BooleanVar(value=get_print_spooler().hold)
+    tk.Checkbutton(print_frame, text="Hold cards for A4 sheet printing", variable=hold_var, bg="#f8f9fa",
+                   font=("Segoe UI", 10), command=lambda: setattr(get_print_spooler(), "hold", hold_var.get())).pack()
+    sheet_options = tk.Frame(print_frame, bg="#f8f9fa")
+    sheet_options.pack()
+    per_sheet_combobox = Combobox(sheet_options, values=[f"{n} per sheet" for n in SHEET_LAYOUTS], state="readonly",
+                                  width=12, font=("Segoe UI", 10))
+    per_sheet_combobox.current(0)
+    per_sheet_combobox.pack(side="left", padx=5)
+    cut_marks_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(sheet_options, text="Cut marks", variable=cut_marks_var, bg="#f8f9fa",
+                   font=("Segoe UI", 10)).pack(side="left", padx=5)
+
+    def print_held_cards():
+        get_print_spooler().release_held(int(per_sheet_combobox.get().split()[0]), cut_marks_var.get())
+
+    btn_print_held = tk.Button(print_frame, text="Print Held Cards", width=32, state="disabled",
+                               command=print_held_cards, bg="#555", fg="white", activebackground="#333",
+                               relief="raised", cursor="hand2", font=("Segoe UI", 11))
+    btn_print_held.pack(pady=(4, 0))
+
+    def poll_print_queue():
+        status = get_print_spooler().status()
+        held = f", {status['held']} held" if status["held"] else ""
+        if status["save_error"]:
+            print_status_label.config(text=f"Print queue: {status['pending']} waiting{held} ({status['save_error']})",
+                                      fg="#b22222")
+        elif status["failed"]:
+            print_status_label.config(text=f"Print queue: {status['pending']} waiting{held}, {status['failed']} failed "
+                                           f"({status['last_error']})", fg="#b22222")
+        elif status["pending"] or status["held"]:
+            print_status_label.config(text=f"Print queue: {status['pending']} waiting{held}", fg="#555")
+        else:
+            print_status_label.config(text="Print queue: empty", fg="#555")
+        btn_retry_prints.config(state="normal" if status["failed"] else "disabled")
+        btn_print_held.config(state="normal" if status["held"] else "disabled",
+                              text=f"Print Held Cards ({status['held']})" if status["held"] else "Print Held Cards")
+        if status["failed"] > print_state["failed"]:
+            messagebox.showwarning("Printing Failed", f"A card could not be printed: {status['last_error']}\n"
+                                   "It stays in the print queue; use Retry Failed Prints once the printer is ready.",
+                                   parent=app)
+        print_state["failed"] = status["failed"]
+        print_frame.after(PRINT_STATUS_POLL_MS, poll_print_queue)
+
+    poll_print_queue()
+    return print_frame
+
+
+def export_cards_dialog(parent=None):
+    # Streams the cards of a registration-date or ID range into one PDF on a worker thread
+    dlg = tk.Toplevel(parent)
+    dlg.title("Export Cards to PDF")
+    dlg.geometry("430x330")
+    dlg.resizable(False, False)
+    dlg.grab_set()
+    today = datetime.datetime.today().strftime("%d-%m-%Y")
+
+    fields = {}
+    for row, (key, label) in enumerate([("date_from", "From date (dd-mm-yyyy):"), ("date_to", "To date (dd-mm-yyyy):"),
+                                        ("id_from", "From patient ID:"), ("id_to", "To patient ID:")]):
+        tk.Label(dlg, text=label, anchor="w", width=22, font=("Segoe UI", 11)).grid(row=row, column=0, padx=10, pady=5,
+                                                                                   sticky="w")
+        entry = tk.Entry(dlg, width=22, font=("Segoe UI", 11))
+        entry.grid(row=row, column=1, padx=10, pady=5)
+        fields[key] = entry
+    tk.Label(dlg, text="Layout:", anchor="w", width=22, font=("Segoe UI", 11)).grid(row=4, column=0, padx=10, pady=5,
+                                                                                   sticky="w")
+    layout_combobox = Combobox(dlg, values=["1 per page"] + [f"{n} per sheet" for n in SHEET_LAYOUTS],
+                               state="readonly", width=20, font=("Segoe UI", 11))
+    layout_combobox.current(0)
+    layout_combobox.grid(row=4, column=1, padx=10, pady=5)
+    progress = Progressbar(dlg, mode="indeterminate", length=390)
+    progress.grid(row=5, column=0, columnspan=2, padx=10, pady=(10, 0))
+    job = {"path": None, "result": None}
+
+    def run_export(pdf_path, options):
+        try:
+            job["result"] = (export_cards_to_pdf(pdf_path, **options), None)
+        except Exception as e:
+            job["result"] = (None, e)
+
+    def poll_export():
+        if job["result"] is None:
+            dlg.after(SUBMIT_POLL_MS, poll_export)
+            return
+        counts, error = job["result"]
+        job["result"] = None
+        progress.stop()
+        btn_export.config(state="normal")
+        if error is not None:
+            messagebox.showerror("Export Failed", f"Could not export cards: {error}", parent=dlg)
+            return
+        exported, rendered = counts
+        messagebox.showinfo("Export Complete", f"{exported} cards ({rendered} re-rendered from the ledger) exported to:"
+                                               f"\n{job['path']}", parent=dlg)
+
+    def start_export():
+        pdf_path = filedialog.asksaveasfilename(parent=dlg, defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")],
+                                                initialfile=f"patient_cards_{today}.pdf")
+        if not pdf_path:
+            return
+        per_page = int(layout_combobox.get().split()[0])
+        options = {key: entry.get().strip() or None for key, entry in fields.items()}
+        # Same defaults as --export-pdf: today's cards when no range is given, a single day when only From date is,
+        # and no date limit at all on an ID range
+        id_range = options["id_from"] or options["id_to"]
+        if not (options["date_from"] or id_range):
+            options["date_from"] = today
+        if not (options["date_to"] or id_range):
+            options["date_to"] = options["date_from"]
+        options.update(per_page=per_page, cut_marks=per_page > 1)
+        job["path"] = pdf_path
+        btn_export.config(state="disabled")
+        progress.start(10)
+        threading.Thread(target=run_export, args=(pdf_path, options), daemon=True).start()
+        dlg.after(SUBMIT_POLL_MS, poll_export)
+
+    btn_export = tk.Button(dlg, text="Export", width=16, command=start_export, bg="#0078d7", fg="white",
+                           activebackground="#005a9e", relief="raised", cursor="hand2", font=("Segoe UI", 11, "bold"))
+    btn_export.grid(row=6, column=0, padx=10, pady=15)
+    tk.Button(dlg, text="Close", width=16, command=dlg.destroy, bg="#555", fg="white", activebackground="#333",
+              relief="raised", cursor="hand2", font=("Segoe UI", 11)).grid(row=6, column=1, padx=10, pady=15)
+    dlg.transient(parent)
+
+
+def open_card_file(card, parent=None):
+    # The remembered path first; the resolver finds cards that were moved by a layout migration since
+    path = card["path"] if os.path.exists(card["path"]) else find_card_file(card["id"], card["registration_date"])
+    if path:
+        open_image_default_viewer(path)
+    else:
+        messagebox.showwarning("Card Missing", f"The card file for {card['id']} is no longer at:\n{card['path']}\n"
+                               "Use Export Cards to PDF to re-render it from the ledger.", parent=parent)
+
+
+def recent_cards_dialog(parent=None):
+    cards = get_recent_cards().entries()
+    dlg = tk.Toplevel(parent)
+    dlg.title("Recent ID Cards")
+    dlg.geometry("560x420")
+    list_frame = tk.Frame(dlg)
+    list_frame.pack(fill="both", expand=True, padx=10, pady=10)
+    scrollbar = tk.Scrollbar(list_frame)
+    scrollbar.pack(side="right", fill="y")
+    card_list = tk.Listbox(list_frame, font=("Consolas", 11), yscrollcommand=scrollbar.set, activestyle="dotbox")
+    card_list.pack(side="left", fill="both", expand=True)
+    scrollbar.config(command=card_list.yview)
+    for card in cards:
+        card_list.insert(tk.END, f"{card['id']:<20} {card['registration_date']:<12} {card['name']}")
+    if cards:
+        card_list.selection_set(0)
+    else:
+        card_list.insert(tk.END, "No ID card has been generated yet.")
+
+    def open_selected(event=None):
+        selection = card_list.curselection()
+        if cards and selection:
+            open_card_file(cards[selection[0]], parent=dlg)
+
+    card_list.bind("<Double-Button-1>", open_selected)
+    card_list.bind("<Return>", open_selected)
+    btn_frame = tk.Frame(dlg)
+    btn_frame.pack(pady=(0, 10))
+    tk.Button(btn_frame, text="Open Card", width=16, command=open_selected, bg="#0078d7", fg="white",
+              activebackground="#005a9e", relief="raised", cursor="hand2",
+              font=("Segoe UI", 11, "bold")).pack(side="left", padx=10)
+    tk.Button(btn_frame, text="Close", width=16, command=dlg.destroy, bg="#555", fg="white", activebackground="#333",
+              relief="raised", cursor="hand2", font=("Segoe UI", 11)).pack(side="left", padx=10)
+    dlg.transient(parent)
+    card_list.focus_set()
+
+
+def find_patient_dialog(parent=None):
+    # Returning patients are looked up in the ledger's search index and keep their ID; their card can be reprinted
+    dlg = tk.Toplevel(parent)
+    dlg.title("Find Returning Patient")
+    dlg.geometry("760x460")
+    tk.Label(dlg, text="Patient ID, phone number or name:", font=("Segoe UI", 11, "bold"),
+             fg="#0078d7").pack(anchor="w", padx=10, pady=(10, 0))
+    query_var = tk.StringVar()
+    query_entry = tk.Entry(dlg, textvariable=query_var, font=("Segoe UI", 12))
+    query_entry.pack(fill="x", padx=10, pady=5)
+    list_frame = tk.Frame(dlg)
+    list_frame.pack(fill="both", expand=True, padx=10)
+    scrollbar = tk.Scrollbar(list_frame)
+    scrollbar.pack(side="right", fill="y")
+    patient_list = tk.Listbox(list_frame, font=("Consolas", 11), yscrollcommand=scrollbar.set, activestyle="dotbox")
+    patient_list.pack(side="left", fill="both", expand=True)
+    scrollbar.config(command=patient_list.yview)
+    status_var = tk.StringVar(value="Type a patient ID, the first digits of a phone number or part of a name.")
+    tk.Label(dlg, textvariable=status_var, font=("Segoe UI", 10), fg="#555").pack(anchor="w", padx=10)
+    results = []
+    search_state = {"after": None}
+
+    def run_search():
+        search_state["after"] = None
+        try:
+            results[:] = search_patients(query_var.get())
+        except Exception as e:
+            results[:] = []
+            status_var.set(f"Search failed: {e}")
+        else:
+            status_var.set(f"{len(results)} patient(s) found" if results else "No matching patient.")
+        patient_list.delete(0, tk.END)
+        for p in results:
+            patient_list.insert(tk.END, f"{p['id']:<20} {p['phone'] or '':<12} {p['dob'] or '':<12} {p['name']}")
+        if results:
+            patient_list.selection_set(0)
+
+    def schedule_search(*args):
+        if search_state["after"] is not None:
+            dlg.after_cancel(search_state["after"])
+        search_state["after"] = dlg.after(SEARCH_DEBOUNCE_MS, run_search)
+
+    def selected_patient():
+        selection = patient_list.curselection()
+        return results[selection[0]] if results and selection else None
+
+    def open_selected(event=None):
+        patient = selected_patient()
+        if patient is None:
+            return
+        try:
+            open_image_default_viewer(patient_card_file(patient))
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open the card of {patient['id']}: {e}", parent=dlg)
+
+    def reprint_selected():
+        patient = selected_patient()
+        if patient is None:
+            return
+        try:
+            reprint_patient_card(patient)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not reprint the card of {patient['id']}: {e}", parent=dlg)
+            return
+        status_var.set(f"Card of {patient['id']} ({patient['name']}) sent to the print queue.")
+
+    query_var.trace_add("write", schedule_search)
+    query_entry.bind("<Return>", lambda event: patient_list.focus_set())
+    patient_list.bind("<Double-Button-1>", open_selected)
+    patient_list.bind("<Return>", open_selected)
+    btn_frame = tk.Frame(dlg)
+    btn_frame.pack(pady=10)
+    tk.Button(btn_frame, text="Reprint Card", width=16, command=reprint_selected, bg="#0078d7", fg="white",
+              activebackground="#005a9e", relief="raised", cursor="hand2",
+              font=("Segoe UI", 11, "bold")).pack(side="left", padx=10)
+    tk.Button(btn_frame, text="Open Card", width=16, command=open_selected, bg="#555", fg="white",
+              activebackground="#333", relief="raised", cursor="hand2", font=("Segoe UI", 11)).pack(side="left", padx=10)
+    tk.Button(btn_frame, text="Close", width=16, command=dlg.destroy, bg="#555", fg="white", activebackground="#333",
+              relief="raised", cursor="hand2", font=("Segoe UI", 11)).pack(side="left", padx=10)
+    dlg.transient(parent)
+    query_entry.focus_set()
+
+
+def duplicate_patient_dialog(name, duplicates, parent=None):
+    # Shown before a new ID is issued when the ledger already has someone with the same phone or name and DOB.
+    # Returns ("reprint", patient) to reprint that patient's card, ("register", None) to issue a new ID anyway,
+    # or (None, None) to go back to the form.
+    choice = [None, None]
+    dlg = tk.Toplevel(parent)
+    dlg.title("Possible Returning Patient")
+    dlg.geometry("800x320")
+    dlg.grab_set()
+    tk.Label(dlg, text=f"{name} may already be registered. Reprint the existing card instead of issuing a new ID?",
+             font=("Segoe UI", 11, "bold"), fg="#b22222", wraplength=760, justify="left").pack(anchor="w", padx=10,
+                                                                                             pady=(10, 5))
+    list_frame = tk.Frame(dlg)
+    list_frame.pack(fill="both", expand=True, padx=10)
+    scrollbar = tk.Scrollbar(list_frame)
+    scrollbar.pack(side="right", fill="y")
+    patient_list = tk.Listbox(list_frame, font=("Consolas", 11), yscrollcommand=scrollbar.set, activestyle="dotbox")
+    patient_list.pack(side="left", fill="both", expand=True)
+    scrollbar.config(command=patient_list.yview)
+    for p in duplicates:
+        patient_list.insert(tk.END, f"{p['id']:<20} {p['phone'] or '':<12} {p['dob'] or '':<12} {p['name']}"
+                                    f"  (same {p['match']})")
+    patient_list.selection_set(0)
+
+    def on_reprint(event=None):
+        selection = patient_list.curselection()
+        choice[:] = ["reprint", duplicates[selection[0] if selection else 0]]
+        dlg.destroy()
+
+    def on_register():
+        choice[:] = ["register", None]
+        dlg.destroy()
+
+    patient_list.bind("<Double-Button-1>", on_reprint)
+    btn_frame = tk.Frame(dlg)
+    btn_frame.pack(pady=10)
+    tk.Button(btn_frame, text="Reprint Existing Card", width=20, command=on_reprint, bg="#0078d7", fg="white",
+              activebackground="#005a9e", relief="raised", cursor="hand2",
+              font=("Segoe UI", 11, "bold")).pack(side="left", padx=10)
+    tk.Button(btn_frame, text="Register as New Patient", width=20, command=on_register, bg="#555", fg="white",
+              activebackground="#333", relief="raised", cursor="hand2", font=("Segoe UI", 11)).pack(side="left", padx=10)
+    tk.Button(btn_frame, text="Cancel", width=12, command=dlg.destroy, bg="#555", fg="white", activebackground="#333",
+              relief="raised", cursor="hand2", font=("Segoe UI", 11)).pack(side="left", padx=10)
+    patient_list.focus_set()
+    dlg.wait_window()
+    return tuple(choice)
@@ -0,0 +1,23 @@
+# Core of the GKNMH patient ID generator: IDs, ledger, card rendering and credentials, with no GUI imports,
+# so it can be used from the Tk frontends, worker processes, benchmarks and command-line tools alike.
+from .config import *
+from .auth import (log_user_status, hash_password, is_strong_password, read_credentials, is_user_password_expired,
+                   save_credentials, read_admin_hash, write_admin_hash, get_start_date, is_expired, command_line_login)
+from .validation import calculate_age, validate_date, patient_field_errors, normalize_name, normalize_phone
+from .ledger import (open_ledger, insert_ledger_rows, import_workbook_into_ledger, commit_ledger_rows, LedgerWriter,
+                     get_ledger_writer, write_to_ledger, export_ledger_to_excel)
+from .ids import reserve_patient_numbers, generate_patient_id, patient_number
+from .cards import (generate_qr_code, QrCache, get_qr_cache, cached_qr_code, get_font, get_logo, get_card_template,
+                    create_patient_id_card, card_size, card_qr_size, CardPreview, output_profile, save_card_image)
+from .system import open_image_default_viewer, peak_memory_bytes
+from .pdf import PdfWriter
+from .imposition import impose_sheet, impose_cards_to_pdf
+from .printing import send_to_printer, PrintSpooler, get_print_spooler, print_image_default, print_card
+from .workspace import setup_dirs_and_files
+from .storage import card_file_path, find_card_file, migrate_card_layout
+from .recent import RecentCards, get_recent_cards
+from .search import search_patients, find_duplicate_patients, patient_card_file, reprint_patient_card
+from .registration import register_patient
+from .batch import read_batch_rows, run_batch, batch_main
+from .export import export_cards_to_pdf, export_main
+from .cli import command_line_main
@@ -0,0 +1,6 @@
+import sys
+
+from .cli import command_line_main
+
+if __name__ == "__main__":
+    sys.exit(command_line_main(sys.argv[1:]))
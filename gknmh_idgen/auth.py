@@ -0,0 +1,96 @@
+import os
+import re
+import hashlib
+import getpass
+import datetime
+
+from .config import LICENSE_DIR, CRED_FILE, ADMIN_FILE, START_DATE_FILE
+
+
+def log_user_status(user_type, status):
+    os.makedirs(LICENSE_DIR, exist_ok=True)
+    log_file = os.path.join(LICENSE_DIR, "user_login_log.txt")
+    with open(log_file, "a") as f:
+        f.write(f"{datetime.datetime.now().isoformat()} | {user_type} login status: {status}\n")
+
+
+def hash_password(pw):
+    return hashlib.sha256(pw.encode()).hexdigest()
+
+
+def is_strong_password(pw):
+    return (len(pw) >= 8 and re.search(r"[A-Z]", pw) and re.search(r"[a-z]", pw)
+            and re.search(r"[0-9]", pw) and re.search(r"[!@#$%^&*(),.?\":{}|<>]", pw))
+
+
+def read_credentials():
+    if not os.path.exists(CRED_FILE):
+        return None, None, 0
+    with open(CRED_FILE) as f:
+        lines = f.readlines()
+    if len(lines) < 3:
+        return None, None, 0
+    return lines[0].strip(), lines[1].strip(), int(lines[2].strip())
+
+
+def is_user_password_expired():
+    _, timestamp, _ = read_credentials()
+    if not timestamp:
+        return True
+    try:
+        last_set = datetime.datetime.fromisoformat(timestamp)
+        return (datetime.datetime.now() - last_set).days > 90
+    except:
+        return True
+
+
+def save_credentials(user_hash, timestamp, attempts=0):
+    with open(CRED_FILE, "w") as f:
+        f.write(f"{user_hash}\n{timestamp}\n{attempts}")
+
+
+def read_admin_hash():
+    if not os.path.exists(ADMIN_FILE):
+        return ""
+    with open(ADMIN_FILE) as f:
+        return f.read().strip()
+
+
+def write_admin_hash(new_hash):
+    with open(ADMIN_FILE, "w") as f:
+        f.write(new_hash)
+
+
+def get_start_date():
+    with open(START_DATE_FILE) as file:
+        return datetime.datetime.strptime(file.read().strip(), "%d-%m-%Y")
+
+
+def is_expired():
+    return datetime.datetime.today() > get_start_date() + datetime.timedelta(days=300)
+
+
+def command_line_login(purpose):
+    # Same checks as the GUI user login, for the headless entry points; purpose only labels the log entries
+    if is_expired():
+        print("The ID generator has expired. Please contact support.")
+        return False
+    stored_hash, timestamp, attempts = read_credentials()
+    if stored_hash is None or is_user_password_expired():
+        print("No valid user password is set. Log in through the GUI once to set one.")
+        return False
+    # Failed tries count against the same 3 attempts as the GUI login, so re-running a command cannot bypass the lockout
+    if attempts >= 3:
+        log_user_status("User", f"{purpose} login refused, locked after 3 failed attempts")
+        print("Locked after 3 failed login attempts. Log in through the GUI with the admin override to unlock.")
+        return False
+    if hash_password(getpass.getpass("User password: ")) != stored_hash:
+        attempts += 1
+        save_credentials(stored_hash, timestamp, attempts)
+        log_user_status("User", f"{purpose} login failed")
+        print(f"Invalid password. Attempts left: {3 - attempts}")
+        return False
+    if attempts:
+        save_credentials(stored_hash, timestamp, 0)
+    log_user_status("User", f"{purpose} login successful")
+    return True
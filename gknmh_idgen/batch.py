@@ -0,0 +1,175 @@
+import os
+import csv
+import time
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+
+from .config import PICTURES_SUBDIR, ID_PREFIX, BATCH_COLUMNS, CARD_OUTPUT_PROFILE, PICTURES_OUTPUT_PROFILE
+from .auth import command_line_login
+from .ids import reserve_patient_numbers
+from .validation import calculate_age, patient_field_errors, normalize_name, normalize_phone
+from .cards import cached_qr_code, create_patient_id_card, output_profile, save_card_image
+from .ledger import get_ledger_writer, _ledger_row, _cell_text
+from .workspace import setup_dirs_and_files
+from .recent import get_recent_cards
+from .storage import card_file_path
+from .search import find_duplicate_patients
+
+
+def read_batch_rows(path):
+    # Yields (line number, {lower-case heading: text}, problem) for every non-empty row of a CSV or XLSX file. A row
+    # that cannot be read as a whole comes with a problem to report instead of stopping the batch.
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            headers = [_cell_text(h).strip().lower() for h in next(rows, [])]
+            for line_no, row in enumerate(rows, start=2):
+                values = [_cell_text(v).strip() for v in row]
+                if any(values):
+                    yield line_no, dict(zip(headers, values)), None
+        finally:
+            wb.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames  # a header that cannot be read fails the whole file
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    break
+                except csv.Error as e:  # DictReader.line_num only moves on after a good row
+                    yield reader.reader.line_num, {}, f"unreadable row: {e}"
+                    continue
+                # Values past the last heading (an unquoted comma in a name, say) would shift the row: only empty
+                # trailing cells are ignored
+                extra = [v.strip() for v in row.pop(None, []) if v.strip()]
+                values = {k.strip().lower(): (v or "").strip() for k, v in row.items()}
+                if extra:
+                    yield reader.line_num, values, f"more values than column headings: {', '.join(extra)}"
+                elif any(values.values()):
+                    yield reader.line_num, values, None
+
+
+def batch_row_fields(row):
+    fields = {}
+    for field, headings in BATCH_COLUMNS.items():
+        fields[field] = next((row[h] for h in headings if row.get(h)), "")
+    fields["gender"] = fields["gender"].capitalize()
+    if fields["phone"].endswith(".0"):
+        fields["phone"] = fields["phone"][:-2]
+    return fields
+
+
+def _duplicate_keys(fields):
+    # The matches find_duplicate_patients() looks for in the ledger, for rows of the same file that are not in it yet
+    keys = []
+    phone_norm = normalize_phone(fields["phone"])
+    if phone_norm:
+        keys.append(("phone and date of birth", phone_norm, fields["dob"]))
+    name_norm = normalize_name(fields["name"])
+    if name_norm:
+        keys.append(("name and date of birth", name_norm, fields["dob"]))
+    return keys
+
+
+def _render_batch_card(info):
+    # Runs in a worker process: everything it needs travels in `info`, results go back as plain values
+    try:
+        output_filename = card_file_path(info["id"], info["registration_date"],
+                                         suffix=output_profile(CARD_OUTPUT_PROFILE)[1])
+        card = create_patient_id_card(info, cached_qr_code(info["id"]))
+        save_card_image(card, output_filename, CARD_OUTPUT_PROFILE)
+    except Exception as e:
+        return None, f"card rendering failed: {e}"
+    try:
+        save_card_image(card, card_file_path(info["id"], info["registration_date"], PICTURES_SUBDIR,
+                                             suffix=output_profile(PICTURES_OUTPUT_PROFILE)[1]),
+                        PICTURES_OUTPUT_PROFILE)
+    except Exception as e:
+        print(f"Failed saving {info['id']} to Pictures folder: {e}")
+    return output_filename, None
+
+
+def run_batch(path, workers=None, allow_duplicates=False):
+    errors = []
+    valid = []
+    accepted = {}  # duplicate key -> line of the row in this file that was accepted with it
+    for line_no, row, problem in read_batch_rows(path):
+        fields = batch_row_fields(row)
+        if problem:
+            errors.append((line_no, fields["name"], problem))
+            continue
+        problems = patient_field_errors(fields["name"], fields["dob"], fields["gender"], fields["phone"])
+        if problems:
+            errors.append((line_no, fields["name"], "; ".join(problems.values())))
+            continue
+        duplicates = [] if allow_duplicates else find_duplicate_patients(fields["name"], fields["dob"], fields["phone"])
+        keys = [] if allow_duplicates else _duplicate_keys(fields)
+        earlier = next((key for key in keys if key in accepted), None)
+        if duplicates:
+            errors.append((line_no, fields["name"],
+                           f"possible duplicate of {duplicates[0]['id']} (same {duplicates[0]['match']})"))
+        elif earlier:
+            errors.append((line_no, fields["name"],
+                           f"possible duplicate of row {accepted[earlier]} in this file (same {earlier[0]})"))
+        else:
+            valid.append((line_no, fields))
+            for key in keys:
+                accepted.setdefault(key, line_no)
+
+    reg_date = datetime.datetime.today().strftime("%d-%m-%Y")
+    numbers = reserve_patient_numbers(len(valid)) if valid else []
+    infos = [dict(fields, id=f"{ID_PREFIX}{num}", age=calculate_age(fields["dob"], reg_date), registration_date=reg_date)
+             for (_, fields), num in zip(valid, numbers)]
+
+    registered = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_render_batch_card, infos, chunksize=max(1, len(infos) // ((workers or os.cpu_count() or 1) * 4)))
+        for (line_no, _), info, (output_filename, error) in zip(valid, infos, results):
+            if error:
+                errors.append((line_no, info["name"], f"{info['id']}: {error}"))
+            else:
+                registered.append((line_no, info, output_filename))
+
+    # The whole batch goes through the journal and into the ledger as a single commit
+    timestamp = datetime.datetime.now().isoformat()
+    writer = get_ledger_writer()
+    writer.add_rows([_ledger_row(info, "", timestamp) for _, info, _ in registered])
+    writer.flush()
+    get_recent_cards().add_many([(info, output_filename) for _, info, output_filename in registered])
+    return registered, sorted(errors)
+
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(description="Register patients from a CSV/XLSX file without the GUI.")
+    parser.add_argument("--batch", required=True, metavar="FILE",
+                        help="CSV or XLSX with Name, DOB (dd-mm-yyyy), Gender, Care Of and Phone columns")
+    parser.add_argument("--workers", type=int, default=None, help="card rendering processes (default: CPU count)")
+    parser.add_argument("--errors", metavar="CSV", help="also write rejected rows to this CSV file")
+    parser.add_argument("--allow-duplicates", action="store_true",
+                        help="register rows even when the ledger or an earlier row of the file has a patient with "
+                             "the same phone or name and DOB")
+    args = parser.parse_args(argv)
+
+    setup_dirs_and_files()
+    if not command_line_login("Batch"):
+        return 1
+
+    start = time.perf_counter()
+    registered, errors = run_batch(args.batch, args.workers, args.allow_duplicates)
+    for line_no, info, output_filename in registered:
+        print(f"row {line_no}: {info['id']}  {info['name']}  -> {output_filename}")
+    for line_no, name, message in errors:
+        print(f"row {line_no}: REJECTED {name or '(no name)'}: {message}")
+    print(f"{len(registered)} registered, {len(errors)} rejected in {time.perf_counter() - start:.1f}s")
+    if args.errors and errors:
+        with open(args.errors, "w", newline="", encoding="utf-8") as f:
+            out = csv.writer(f)
+            out.writerow(["Row", "Name", "Error"])
+            out.writerows(errors)
+    return 1 if errors else 0
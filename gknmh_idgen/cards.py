@@ -0,0 +1,333 @@
+import os
+import threading
+from collections import OrderedDict
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+from .config import (LOGO_FILE, CARD_SIZE, CARD_MARGIN, CARD_TITLE, CARD_X_LABEL, CARD_X_COLON, CARD_X_VALUE,
+                     CARD_Y_START, CARD_Y_GAP, CARD_QR_SIZE, CARD_FIELD_LABELS, CARD_FOOTER_LINES, QR_BORDER_MODULES,
+                     FONT_SEARCH_PATH, FONT_CANDIDATES, OUTPUT_PROFILES, QR_CACHE_BYTES)
+
+_card_templates = {}
+_card_template_lock = threading.Lock()
+_resource_cache = {}
+_resource_lock = threading.Lock()
+_qr_cache = None
+
+
+def generate_qr_code(data, qr_filename=None, size=CARD_QR_SIZE):
+    qr = qrcode.QRCode(version=1, border=QR_BORDER_MODULES)
+    qr.add_data(data)
+    qr.make(fit=True)
+    # The print card gets whole pixels per module, so its QR fills the slot without resampling, and so does any size
+    # that is an exact multiple of the module count. Other scaled slots (the preview) get that print-size QR scaled by
+    # the same factor: rendered one box size up, then reduced with NEAREST, so the code takes the same share of the
+    # slot as on the printed card.
+    modules = qr.modules_count + 2 * qr.border
+    if size % modules == 0:
+        width = size
+    else:
+        width = max(1, round(CARD_QR_SIZE // modules * modules * size / CARD_QR_SIZE))
+    qr.box_size = max(1, -(-width // modules))
+    qr_img = qr.make_image(fill_color="black", back_color="white").convert("L")
+    if qr_img.width != width:
+        qr_img = qr_img.resize((width, width), Image.NEAREST)
+    # White becomes fully transparent: the alpha channel is one lookup-table pass in C instead of a per-pixel Python loop
+    alpha = qr_img.point(lambda v: 0 if v == 255 else 255)
+    qr_img = Image.merge("RGBA", (qr_img, qr_img, qr_img, alpha))
+    if qr_img.width < size:
+        # Centre on a transparent slot-sized canvas; on the print card the leftover is less than one module
+        slot = Image.new("RGBA", (size, size), (255, 255, 255, 0))
+        offset = (size - qr_img.width) // 2
+        slot.paste(qr_img, (offset, offset))
+        qr_img = slot
+    if qr_filename:
+        qr_img.save(qr_filename)
+    return qr_img
+
+
+class QrCache:
+    # Rendered QR images by (payload, size), least recently used evicted once they take more than max_bytes.
+    # The images are shared: callers paste or save them but must never draw on them.
+    def __init__(self, max_bytes=QR_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, data, size=CARD_QR_SIZE):
+        key = (data, size)
+        with self._lock:
+            qr_img = self._images.get(key)
+            if qr_img is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return qr_img
+            self.misses += 1
+        qr_img = generate_qr_code(data, size=size)  # outside the lock: other threads keep hitting while this renders
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = qr_img
+                self._bytes += _image_bytes(qr_img)
+                while self._bytes > self.max_bytes and len(self._images) > 1:
+                    _, evicted = self._images.popitem(last=False)
+                    self._bytes -= _image_bytes(evicted)
+            return self._images[key]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._images), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+def get_qr_cache():
+    global _qr_cache
+    if _qr_cache is None:
+        _qr_cache = QrCache()
+    return _qr_cache
+
+
+def cached_qr_code(data, qr_filename=None, size=CARD_QR_SIZE):
+    # generate_qr_code() through the shared cache: the preview's constant payload and reprinted IDs are drawn once
+    qr_img = get_qr_cache().get(data, size)
+    if qr_filename:
+        qr_img.save(qr_filename)
+    return qr_img
+
+
+def _file_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None
+
+
+def _resolve_font_file(kind):
+    for name in FONT_CANDIDATES[kind]:
+        for folder in FONT_SEARCH_PATH:
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def get_font(kind, size):
+    # Fonts are loaded once per (kind, size) and reloaded only if the resolved font file changes on disk
+    key = ("font", kind, size)
+    with _resource_lock:
+        cached = _resource_cache.get(key)
+        if cached and _file_mtime(cached[0]) == cached[1]:
+            return cached[2]
+        path = _resolve_font_file(kind)
+        try:
+            font = ImageFont.truetype(path or FONT_CANDIDATES[kind][0], size)
+        except OSError:
+            print(f"No TrueType font found for '{kind}' text; add one to {FONT_SEARCH_PATH[0]} or set GKNMH_FONT_PATH")
+            try:
+                font = ImageFont.load_default(size)
+            except TypeError:
+                font = ImageFont.load_default()
+        _resource_cache[key] = (path, _file_mtime(path), font)
+        return font
+
+
+def get_logo(size):
+    # Resized logo, cached per target size and invalidated by the logo file's mtime
+    mtime = _file_mtime(LOGO_FILE)
+    if mtime is None:
+        return None
+    key = ("logo", size)
+    with _resource_lock:
+        cached = _resource_cache.get(key)
+        if cached and cached[1] == mtime:
+            return cached[2]
+        with Image.open(LOGO_FILE) as src:
+            logo = src.resize(size)
+        _resource_cache[key] = (LOGO_FILE, mtime, logo)
+        return logo
+
+
+def _scaled(length, scale):
+    # Layout lengths are in print pixels (300 dpi); scale 1.0 keeps them exactly as they are
+    return length if scale == 1 else max(1, round(length * scale))
+
+
+def card_size(scale=1.0):
+    return _scaled(CARD_SIZE[0], scale), _scaled(CARD_SIZE[1], scale)
+
+
+def card_qr_size(scale=1.0):
+    # Pass as cached_qr_code(size=...) so a scaled card gets a QR drawn for its slot instead of a resized one
+    return _scaled(CARD_QR_SIZE, scale)
+
+
+def _card_fonts(scale=1.0):
+    return (get_font("regular", _scaled(30, scale)), get_font("regular", _scaled(36, scale)),
+            get_font("bold", _scaled(48, scale)))
+
+
+def _build_card_template(scale=1.0):
+    font, title_font, _ = _card_fonts(scale)
+    w, h = card_size(scale)
+    margin = _scaled(CARD_MARGIN, scale)
+    card = Image.new("RGB", (w, h), "white")
+    draw = ImageDraw.Draw(card)
+
+    # Outer border thick black
+    draw.rectangle([margin, margin, w - margin, h - margin], outline="black", width=_scaled(5, scale))
+
+    # Logo row
+    logo = get_logo((w - 2 * margin, _scaled(200, scale)))
+    if logo is not None:
+        card.paste(logo, (margin, margin))
+
+    # Title "Patient ID Card"
+    draw.text(((w - draw.textlength(CARD_TITLE, title_font)) // 2, margin + _scaled(210, scale)), CARD_TITLE,
+              font=title_font, fill="red")
+
+    # Field labels and colons
+    x_label, x_colon = _scaled(CARD_X_LABEL, scale), _scaled(CARD_X_COLON, scale)
+    for idx, label in enumerate(CARD_FIELD_LABELS):
+        y = _scaled(CARD_Y_START + idx * CARD_Y_GAP, scale)
+        draw.text((x_label, y), label, font=font, fill="black")
+        draw.text((x_colon, y), ":", font=font, fill="black")
+
+    # Footer measurement text
+    for offset, text in CARD_FOOTER_LINES:
+        draw.text((x_label, h - _scaled(offset, scale)), text, font=font, fill="black")
+    return card
+
+
+def get_card_template(scale=1.0):
+    # One template per scale (the printed card and each preview size), rebuilt only when the logo file, the fonts
+    # or the layout constants change
+    key = (_file_mtime(LOGO_FILE), _card_fonts(scale)[:2], CARD_SIZE, CARD_MARGIN, CARD_TITLE, CARD_X_LABEL,
+           CARD_X_COLON, CARD_Y_START, CARD_Y_GAP, tuple(CARD_FIELD_LABELS), tuple(CARD_FOOTER_LINES))
+    with _card_template_lock:
+        cached = _card_templates.get(scale)
+        if cached is None or cached[0] != key:
+            cached = _card_templates[scale] = (key, _build_card_template(scale))
+        return cached[1]
+
+
+def _field_values(info):
+    # Text of each value row, in CARD_FIELD_LABELS order
+    return [info["name"], info["dob"], f"{info['age']} years", info["gender"], info["care_of"], info["phone"],
+            info["registration_date"]]
+
+
+def _value_origin(idx, scale):
+    return _scaled(CARD_X_VALUE, scale), _scaled(CARD_Y_START + idx * CARD_Y_GAP, scale)
+
+
+def _qr_placement(qr_image, scale):
+    qr_size = card_qr_size(scale)
+    if isinstance(qr_image, str):
+        qr_image = Image.open(qr_image).convert("RGBA")
+    if qr_image.size != (qr_size, qr_size):
+        qr_image = qr_image.resize((qr_size, qr_size))
+    return qr_image, (card_size(scale)[0] - qr_size - _scaled(CARD_MARGIN, scale), _scaled(CARD_Y_START, scale))
+
+
+def create_patient_id_card(info, qr_image, output_filename=None, scale=1.0):
+    # scale < 1 draws the same layout natively at a smaller size (the live preview); 1.0 is the 300 dpi print card
+    font, _, id_font = _card_fonts(scale)
+    w, h = card_size(scale)
+    margin = _scaled(CARD_MARGIN, scale)
+    card = get_card_template(scale).copy()
+    draw = ImageDraw.Draw(card)
+
+    # Patient ID big and centered
+    draw.text(((w - draw.textlength(info["id"], id_font)) // 2, margin + _scaled(270, scale)), info["id"],
+              font=id_font, fill="blue")
+
+    # Field values, in CARD_FIELD_LABELS order
+    for idx, value in enumerate(_field_values(info)):
+        draw.text(_value_origin(idx, scale), value, font=font, fill="black")
+
+    # QR code
+    qr_image, qr_origin = _qr_placement(qr_image, scale)
+    card.paste(qr_image, qr_origin, qr_image)
+    if output_filename:
+        card.save(output_filename, dpi=(300, 300))
+    return card
+
+
+class CardPreview:
+    # Keeps the last rendered card and, when only field values change, redraws just the rows that changed. update()
+    # returns the frame and the boxes (left, top, right, bottom) that differ from the previous frame; the result is
+    # pixel-identical to a full create_patient_id_card() of the same info.
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self.frame = None
+        self._template = None
+        self._patient_id = None
+        self._values = None
+        self._qr = None
+
+    def reset(self):
+        # The next update() renders the whole card again (e.g. after the displayed image was thrown away)
+        self.frame = None
+
+    def update(self, info):
+        template = get_card_template(self.scale)
+        values = _field_values(info)
+        if self.frame is None or template is not self._template or info["id"] != self._patient_id:
+            self._qr = cached_qr_code(info["id"], size=card_qr_size(self.scale))
+            self.frame = create_patient_id_card(info, self._qr, scale=self.scale)
+            self._template, self._patient_id, self._values = template, info["id"], values
+            return self.frame, [(0, 0) + self.frame.size]
+        font = _card_fonts(self.scale)[0]
+        draw = ImageDraw.Draw(self.frame)
+        qr_image, (qr_x, qr_y) = _qr_placement(self._qr, self.scale)
+        boxes = []
+        for idx, (old, new) in enumerate(zip(self._values, values)):
+            if old == new:
+                continue
+            origin = _value_origin(idx, self.scale)
+            old_box, new_box = draw.textbbox(origin, old, font=font), draw.textbbox(origin, new, font=font)
+            box = (max(0, min(old_box[0], new_box[0])), max(0, min(old_box[1], new_box[1])),
+                   min(self.frame.width, max(old_box[2], new_box[2])),
+                   min(self.frame.height, max(old_box[3], new_box[3])))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                continue
+            # Same order as a full render: template, then the value text, then the part of the QR over this row
+            self.frame.paste(template.crop(box), box[:2])
+            draw.text(origin, new, font=font, fill="black")
+            overlap = (max(box[0], qr_x), max(box[1], qr_y), min(box[2], qr_x + qr_image.width),
+                       min(box[3], qr_y + qr_image.height))
+            if overlap[0] < overlap[2] and overlap[1] < overlap[3]:
+                qr_part = qr_image.crop((overlap[0] - qr_x, overlap[1] - qr_y, overlap[2] - qr_x, overlap[3] - qr_y))
+                self.frame.paste(qr_part, overlap[:2], qr_part)
+            boxes.append(box)
+        self._values = values
+        return self.frame, boxes
+
+
+def output_profile(name):
+    try:
+        return OUTPUT_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown output profile {name!r}; expected one of {', '.join(OUTPUT_PROFILES)}")
+
+
+def save_card_image(card, path, profile):
+    # Encodes a rendered card with a named output profile; the file extension is the caller's (see output_profile)
+    image_format, _, mode, options = output_profile(profile)
+    if mode == "1":
+        card = card.convert("L").convert("1", dither=Image.Dither.NONE)
+    elif mode is not None:
+        card = card.convert(mode)
+    card.save(path, image_format, dpi=(300, 300), **options)
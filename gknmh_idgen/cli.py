@@ -0,0 +1,12 @@
+from .batch import batch_main
+from .export import export_main
+from .storage import migrate_main
+
+
+def command_line_main(argv):
+    # Headless entry point shared by `python -m gknmh_idgen` and the GUI scripts when given arguments
+    if any(arg.startswith("--export-pdf") for arg in argv):
+        return export_main(argv)
+    if "--migrate-layout" in argv:
+        return migrate_main(argv)
+    return batch_main(argv)
@@ -0,0 +1,155 @@
+import os
+
+# --- CONFIG PATHS ---
+BASE_DIR = os.path.join(os.path.expanduser("~"), "Documents", "id_gen_admin")
+EXCEL_FILE = os.path.join(BASE_DIR, "data_base", "patient_data.xlsx")
+ID_OUTPUT_DIR = os.path.join(BASE_DIR, "gen_id")
+LOGO_FILE = os.path.join(BASE_DIR, "logo", "logo.png")
+LICENSE_DIR = os.path.join(BASE_DIR, "logo", "license")
+CRED_FILE = os.path.join(LICENSE_DIR, "cred.txt")
+ADMIN_FILE = os.path.join(LICENSE_DIR, "admin.txt")
+START_DATE_FILE = os.path.join(LICENSE_DIR, "start_date.txt")
+
+PICTURES_DIR = os.path.join(os.path.expanduser("~"), "Pictures")
+PICTURES_SUBDIR = os.path.join(PICTURES_DIR, "GKNMH_ID_Generator")
+PICTURES_EXCEL = os.path.join(PICTURES_SUBDIR, "patient_data_pictures.xlsx")
+
+# --- PATIENT IDS ---
+# The next number lives in the ledger's counters table
+ID_PREFIX = 'GKNMH-CERWP-'
+ID_START_NUMBER = 1000
+
+# --- LEDGER ---
+LEDGER_DB = os.path.join(BASE_DIR, "data_base", "patient_ledger.db")
+# Each process journals to its own ledger_journal.<pid>.jsonl, held by a lock file while it runs; journals left by a
+# process that has exited are replayed by the next one to start
+LEDGER_JOURNAL = os.path.join(BASE_DIR, "data_base", "ledger_journal.jsonl")
+# Rows whose patient ID was taken by another process between the check in add() and the flush, kept for manual repair
+LEDGER_REJECTS = os.path.join(BASE_DIR, "data_base", "ledger_rejected.jsonl")
+# Group commit: buffered registrations are flushed after this many rows or this many seconds, whichever comes first
+LEDGER_FLUSH_COUNT = 20
+LEDGER_FLUSH_SECONDS = 5.0
+# Also append each flushed batch to patient_data.xlsx / patient_data_pictures.xlsx (one load/save per workbook per batch)
+LEDGER_MIRROR_EXCEL = False
+
+EXCEL_HEADERS = ["Patient ID", "Name", "DOB", "Age", "Gender", "Care Of", "Phone", "QR Path", "Reg Date", "Timestamp"]
+PICTURES_HEADERS = ["Patient ID", "Name", "DOB", "Age", "Gender", "Care Of", "Phone", "Registration Date", "Timestamp"]
+
+# --- PATIENT FIELDS ---
+GENDER_OPTIONS = ["Male", "Female", "Other"]
+# Accepted (lower-case) column headings for headless batch registration files
+BATCH_COLUMNS = {
+    "name": ["name", "patient name"],
+    "dob": ["dob", "date of birth", "date of birth (dd-mm-yyyy)"],
+    "gender": ["gender", "sex"],
+    "care_of": ["care of", "care_of", "c/o"],
+    "phone": ["phone", "phone no", "phone number", "mobile"],
+}
+
+# --- PATIENT SEARCH ---
+# Honorifics dropped from the start of a name before it is indexed or searched, so "Mr. Ravi" finds "Ravi"
+NAME_TITLES = ["mr", "mrs", "ms", "miss", "dr", "shri", "sri", "smt", "kumari", "master", "baby"]
+SEARCH_RESULT_LIMIT = 50
+SEARCH_MIN_PHONE_DIGITS = 3
+# Name words that only match fuzzily must be at least this similar (difflib ratio) to an indexed word
+SEARCH_FUZZY_CUTOFF = 0.75
+SEARCH_FUZZY_WORDS = 5
+
+# --- OUTPUT PROFILES ---
+# name: (Pillow format, file extension, image mode to convert to or None for RGB, save options).
+# Encode time and size of each on this machine: python benchmarks/bench_output_profiles.py
+OUTPUT_PROFILES = {
+    "archival_png": ("PNG", ".png", None, {"optimize": True}),
+    "png": ("PNG", ".png", None, {"compress_level": 6}),
+    "fast_png": ("PNG", ".png", None, {"compress_level": 1}),
+    "jpeg": ("JPEG", ".jpg", None, {"quality": 92, "subsampling": 0}),  # 4:4:4 keeps the QR and small text crisp
+    "webp": ("WEBP", ".webp", None, {"quality": 90, "method": 4}),
+    "grayscale_png": ("PNG", ".png", "L", {"compress_level": 6}),
+    "thermal_1bit": ("PNG", ".png", "1", {"optimize": True}),  # hard black/white threshold, no dithering
+}
+# Profile per destination: the card kept in gen_id/, the Pictures mirror, and the file sent to the printer
+# (None prints the gen_id/ card as it is; any other profile writes a separate copy to print_batches/)
+CARD_OUTPUT_PROFILE = os.environ.get("GKNMH_CARD_PROFILE", "png")
+PICTURES_OUTPUT_PROFILE = os.environ.get("GKNMH_PICTURES_PROFILE", "jpeg")
+PRINT_OUTPUT_PROFILE = os.environ.get("GKNMH_PRINT_PROFILE") or None
+
+# --- CARD FILE LAYOUT ---
+# How <ID>.png (and <ID>_qr.png) are spread over sub-folders of gen_id/ and the Pictures mirror:
+# "month" = YYYY/MM of the registration date, "id" = one folder per CARD_SHARD_SIZE IDs, "flat" = no sub-folders.
+# After changing it, move existing cards with `python -m gknmh_idgen --migrate-layout`.
+CARD_LAYOUT = os.environ.get("GKNMH_CARD_LAYOUT", "month")
+CARD_LAYOUTS = ["month", "id", "flat"]
+CARD_SHARD_SIZE = 1000
+
+# --- RECENT CARDS ---
+# Newest cards first, kept in memory and in this file so "Preview Last ID Card" never has to scan gen_id/
+RECENT_CARDS_FILE = os.path.join(BASE_DIR, "data_base", "recent_cards.json")
+RECENT_CARDS_LIMIT = 200
+
+# --- REGISTRATION ---
+# Threads for the independent registration stages (card file, Pictures copy, ledger, printing) of one patient
+REGISTRATION_STAGE_WORKERS = 4
+
+# --- PRINTING ---
+PRINT_QUEUE_FILE = os.path.join(BASE_DIR, "data_base", "print_queue.json")
+# Run this instead of the system spooler, e.g. GKNMH_PRINT_COMMAND="cp {file} /tmp/printed/" to test without a printer.
+# {file} is replaced by the card path (appended when the command has no {file}).
+PRINT_COMMAND = os.environ.get("GKNMH_PRINT_COMMAND", "")
+PRINT_TIMEOUT_SECONDS = 60
+# A failed job is retried after PRINT_RETRY_SECONDS, twice that, ... and parked as failed after PRINT_MAX_ATTEMPTS tries
+PRINT_MAX_ATTEMPTS = 3
+PRINT_RETRY_SECONDS = 10.0
+# While holding, new cards wait in the queue until they are released together as one imposed A4 PDF
+PRINT_HOLD_FOR_SHEETS = False
+PRINT_BATCH_DIR = os.path.join(BASE_DIR, "print_batches")
+
+# --- SHEET IMPOSITION ---
+SHEET_SIZE = (2480, 3508)  # A4 at 300 dpi
+SHEET_DPI = 300
+SHEET_MARGIN = 59  # 5 mm, clear of most printers' unprintable border
+SHEET_GUTTER = 72  # space between cards for the cut marks
+# Cards per sheet: (columns, rows, turn the card on its side). Cards are only ever scaled down to fit.
+SHEET_LAYOUTS = {4: (2, 2, False), 2: (1, 2, True)}
+CUT_MARK_LENGTH = 28
+CUT_MARK_OFFSET = 6
+PDF_JPEG_QUALITY = 92
+
+# --- CARD LAYOUT ---
+# A6 at 300 dpi. Everything except the ID, the field values and the QR is static and drawn once into a template.
+CARD_SIZE = (1240, 1748)
+CARD_MARGIN = 50
+CARD_TITLE = "Patient ID Card"
+CARD_X_LABEL = CARD_MARGIN + 60
+CARD_X_COLON = CARD_X_LABEL + 300
+CARD_X_VALUE = CARD_X_COLON + 20
+CARD_Y_START = CARD_MARGIN + 400
+CARD_Y_GAP = 70
+CARD_QR_SIZE = 400
+CARD_FIELD_LABELS = ["Patient Name", "Date of Birth", "Age", "Gender", "Care Of", "Phone No", "Registration Date"]
+CARD_FOOTER_LINES = [(700, "BP: ________ mm/Hg     Pulse: ______/min"),
+                     (600, "Blood Sugar: FBS/RBS ________ mgs/dl"),
+                     (500, "Oral:")]
+
+QR_BORDER_MODULES = 6
+# Rendered QR images are kept (least recently used dropped first) up to this many bytes; a print-size QR is 625 KB
+QR_CACHE_BYTES = 16 * 2 ** 20
+# Keep <ID>_qr.png next to the card; off by default because the QR is handed to the card renderer in memory
+SAVE_QR_FILES = False
+
+# Card fonts are looked up by file name in these folders (GKNMH_FONT_PATH, os.pathsep separated, is searched first)
+FONT_SEARCH_PATH = [d for d in os.environ.get("GKNMH_FONT_PATH", "").split(os.pathsep) if d] + [
+    os.path.join(BASE_DIR, "fonts"),
+    os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+    "/Library/Fonts",
+    "/System/Library/Fonts/Supplemental",
+    "/usr/share/fonts/truetype/msttcorefonts",
+    "/usr/share/fonts/truetype/liberation",
+    "/usr/share/fonts/truetype/dejavu",
+    "/usr/share/fonts/liberation-sans",
+    "/usr/share/fonts/dejavu-sans-fonts",
+    "/usr/share/fonts/TTF",
+]
+FONT_CANDIDATES = {
+    "regular": ["arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf"],
+    "bold": ["arialbd.ttf", "Arial Bold.ttf", "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf"],
+}
@@ -0,0 +1,64 @@
+from contextlib import closing
+
+from .config import ID_PREFIX, ID_START_NUMBER
+from .ledger import open_ledger, get_ledger_writer
+
+
+def _highest_issued_number(conn, pending):
+    # Only used to rebuild a missing or stale counter: one pass over the ledger's ID index
+    highest = ID_START_NUMBER - 1
+    for (value,) in conn.execute("SELECT patient_id FROM patients WHERE patient_id LIKE ?", (ID_PREFIX + "%",)):
+        if value[len(ID_PREFIX):].isdigit():
+            highest = max(highest, int(value[len(ID_PREFIX):]))
+    for value in pending:
+        if value.startswith(ID_PREFIX) and value[len(ID_PREFIX):].isdigit():
+            highest = max(highest, int(value[len(ID_PREFIX):]))
+    return highest
+
+
+def _any_issued(conn, numbers, pending):
+    for num in numbers:
+        patient_id = f"{ID_PREFIX}{num}"
+        if patient_id in pending or conn.execute("SELECT 1 FROM patients WHERE patient_id = ?",
+                                                 (patient_id,)).fetchone():
+            return True
+    return False
+
+
+def reserve_patient_numbers(count=1):
+    # The counter row is read, checked against the ledger and advanced in one write transaction, so the GUI and a
+    # --batch run started together can never be handed the same number. A crash can skip numbers but never reissue one.
+    # Taken before the transaction: creating the writer replays leftover journals, which needs the write lock itself
+    pending = get_ledger_writer().pending_ids()
+    with closing(open_ledger()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM counters WHERE name = 'patient_id'").fetchone()
+            if row is None:
+                next_num = _highest_issued_number(conn, pending) + 1
+            else:
+                next_num = max(row[0], ID_START_NUMBER)
+                if _any_issued(conn, range(next_num, next_num + count), pending):
+                    # The counter is behind the ledger (restored from a backup, edited by hand): rebuild it
+                    next_num = max(next_num, _highest_issued_number(conn, pending) + 1)
+            conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('patient_id', ?)", (next_num + count,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return list(range(next_num, next_num + count))
+
+
+def generate_patient_id():
+    return f"{ID_PREFIX}{reserve_patient_numbers(1)[0]}"
+
+
+def patient_number(patient_id):
+    # Accepts a full patient ID or just its number
+    text = str(patient_id).strip()
+    if text.upper().startswith(ID_PREFIX):
+        text = text[len(ID_PREFIX):]
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError(f"{patient_id!r} is not a patient ID")
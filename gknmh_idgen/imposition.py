@@ -0,0 +1,58 @@
+from PIL import Image, ImageDraw
+
+from .config import (SHEET_SIZE, SHEET_MARGIN, SHEET_GUTTER, SHEET_LAYOUTS, CUT_MARK_LENGTH, CUT_MARK_OFFSET,
+                     CARD_SIZE)
+from .pdf import PdfWriter
+
+
+def sheet_slots(per_sheet):
+    # Returns (card size on the sheet, turn card on its side, [top-left corner of each slot])
+    columns, rows, rotate = SHEET_LAYOUTS[per_sheet]
+    card_w, card_h = (CARD_SIZE[1], CARD_SIZE[0]) if rotate else CARD_SIZE
+    cell_w = (SHEET_SIZE[0] - 2 * SHEET_MARGIN - (columns - 1) * SHEET_GUTTER) // columns
+    cell_h = (SHEET_SIZE[1] - 2 * SHEET_MARGIN - (rows - 1) * SHEET_GUTTER) // rows
+    scale = min(1.0, cell_w / card_w, cell_h / card_h)
+    size = (int(card_w * scale), int(card_h * scale))
+    # Centre the whole grid so the outer cut marks get the same room on every side
+    grid_w = columns * size[0] + (columns - 1) * SHEET_GUTTER
+    grid_h = rows * size[1] + (rows - 1) * SHEET_GUTTER
+    x0 = (SHEET_SIZE[0] - grid_w) // 2
+    y0 = (SHEET_SIZE[1] - grid_h) // 2
+    slots = [(x0 + c * (size[0] + SHEET_GUTTER), y0 + r * (size[1] + SHEET_GUTTER))
+             for r in range(rows) for c in range(columns)]
+    return size, rotate, slots
+
+
+def _draw_cut_marks(draw, x, y, w, h):
+    # Short lines continuing each card edge just outside its corners; they never run into the card itself
+    far = CUT_MARK_OFFSET + CUT_MARK_LENGTH
+    for cx, sx in ((x, -1), (x + w - 1, 1)):
+        for cy, sy in ((y, -1), (y + h - 1, 1)):
+            draw.line([(cx + sx * CUT_MARK_OFFSET, cy), (cx + sx * far, cy)], fill="black", width=2)
+            draw.line([(cx, cy + sy * CUT_MARK_OFFSET), (cx, cy + sy * far)], fill="black", width=2)
+
+
+def impose_sheet(cards, per_sheet=4, cut_marks=True):
+    size, rotate, slots = sheet_slots(per_sheet)
+    sheet = Image.new("RGB", SHEET_SIZE, "white")
+    draw = ImageDraw.Draw(sheet)
+    for card, (x, y) in zip(cards, slots):
+        if isinstance(card, str):
+            card = Image.open(card)
+        card = card.convert("RGB")
+        if rotate:
+            card = card.transpose(Image.ROTATE_90)
+        if card.size != size:
+            card = card.resize(size, Image.LANCZOS)
+        sheet.paste(card, (x, y))
+        if cut_marks:
+            _draw_cut_marks(draw, x, y, *size)
+    return sheet
+
+
+def impose_cards_to_pdf(cards, pdf_path, per_sheet=4, cut_marks=True):
+    # One A4 page per `per_sheet` cards, written page by page; returns the number of pages
+    with PdfWriter(pdf_path) as pdf:
+        for start in range(0, len(cards), per_sheet):
+            pdf.add_page(impose_sheet(cards[start:start + per_sheet], per_sheet, cut_marks))
+    return pdf.page_count
@@ -0,0 +1,370 @@
+import os
+import glob
+import json
+import atexit
+import sqlite3
+import datetime
+import threading
+from collections import Counter
+from contextlib import closing
+
+import openpyxl
+
+from .config import (EXCEL_FILE, PICTURES_EXCEL, LEDGER_DB, LEDGER_JOURNAL, LEDGER_FLUSH_COUNT, LEDGER_FLUSH_SECONDS,
+                     LEDGER_MIRROR_EXCEL, LEDGER_REJECTS, EXCEL_HEADERS, PICTURES_HEADERS)
+from .validation import normalize_name, normalize_phone
+from .system import try_lock_file, unlock_file
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    dob TEXT,
+    age,
+    gender TEXT,
+    care_of TEXT,
+    phone TEXT,
+    qr_path TEXT,
+    registration_date TEXT,
+    reg_date_iso TEXT,
+    timestamp TEXT,
+    name_norm TEXT,
+    phone_norm TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_patients_phone ON patients(phone);
+CREATE INDEX IF NOT EXISTS idx_patients_name ON patients(name);
+CREATE INDEX IF NOT EXISTS idx_patients_reg_date ON patients(reg_date_iso);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Lookup index for returning patients (see search.py): normalised name and phone, and every word of the name.
+# (name_norm, dob) and (phone_norm, dob) also serve the duplicate check run before a new ID is issued.
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS name_words (
+    word TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    PRIMARY KEY (word, patient_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_patients_name_norm_dob ON patients(name_norm, dob);
+CREATE INDEX IF NOT EXISTS idx_patients_phone_norm_dob ON patients(phone_norm, dob);
+"""
+
+_ledger_writer = None
+
+
+def open_ledger():
+    conn = sqlite3.connect(LEDGER_DB)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(LEDGER_SCHEMA + SEARCH_SCHEMA)
+    return conn
+
+
+def _to_iso_date(date_text):
+    try:
+        return datetime.datetime.strptime(date_text, "%d-%m-%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%d-%m-%Y")
+    return str(value)
+
+
+def _ledger_row(info, qr_path, timestamp):
+    return (info["id"], info["name"], info["dob"], info["age"], info["gender"], info["care_of"], info["phone"],
+            qr_path, info["registration_date"], _to_iso_date(info["registration_date"]), timestamp)
+
+
+def insert_ledger_rows(conn, rows, ignore_existing=False):
+    # New registrations must have new IDs: a clash raises sqlite3.IntegrityError. Replaying a journal or importing the
+    # workbook passes ignore_existing and gets back only the rows that were actually new, so no patient is duplicated.
+    insert = "INSERT OR IGNORE" if ignore_existing else "INSERT"
+    inserted = []
+    for row in rows:
+        name_norm = normalize_name(row[1])
+        cur = conn.execute(f"{insert} INTO patients (patient_id, name, dob, age, gender, care_of, phone, qr_path, "
+                           "registration_date, reg_date_iso, timestamp, name_norm, phone_norm) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           tuple(row) + (name_norm, normalize_phone(row[6])))
+        if cur.rowcount:
+            conn.executemany("INSERT OR IGNORE INTO name_words (word, patient_id) VALUES (?, ?)",
+                             [(word, row[0]) for word in set(name_norm.split())])
+            inserted.append(row)
+    return inserted
+
+
+def import_workbook_into_ledger(conn):
+    # One-time migration of an existing patient_data.xlsx into an empty ledger
+    if not os.path.exists(EXCEL_FILE):
+        return 0
+    wb = openpyxl.load_workbook(EXCEL_FILE, read_only=True)
+    rows = []
+    try:
+        for row in wb.active.iter_rows(min_row=2, max_col=len(EXCEL_HEADERS), values_only=True):
+            row = [_cell_text(v) for v in row] + [""] * (len(EXCEL_HEADERS) - len(row))
+            if not row[0]:
+                continue
+            rows.append(tuple(row[:9]) + (_to_iso_date(row[8]), row[9]))
+    finally:
+        wb.close()
+    with conn:
+        insert_ledger_rows(conn, rows, ignore_existing=True)
+    return len(rows)
+
+
+def _append_rows_to_workbook(path, sheet_title, headers, rows):
+    if os.path.exists(path):
+        wb = openpyxl.load_workbook(path)
+        ws = wb.active
+    else:
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = sheet_title
+        ws.append(headers)
+    for row in rows:
+        ws.append(list(row))
+    wb.save(path)
+
+
+def mirror_rows_to_excel(rows):
+    os.makedirs(os.path.dirname(PICTURES_EXCEL), exist_ok=True)
+    _append_rows_to_workbook(EXCEL_FILE, "Sheet", EXCEL_HEADERS, [r[:9] + r[10:] for r in rows])
+    _append_rows_to_workbook(PICTURES_EXCEL, "Patient Data Pictures", PICTURES_HEADERS,
+                             [r[:7] + r[8:9] + r[10:] for r in rows])
+
+
+def _commit_rows(rows, ignore_existing=False):
+    with closing(open_ledger()) as conn, conn:
+        return insert_ledger_rows(conn, rows, ignore_existing)
+
+
+def commit_ledger_rows(rows, mirror_excel=LEDGER_MIRROR_EXCEL, ignore_existing=False):
+    inserted = _commit_rows(rows, ignore_existing)
+    if mirror_excel and inserted:
+        mirror_rows_to_excel(inserted)
+    return len(inserted)
+
+
+def _read_journal(path):
+    rows = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    rows.append(tuple(json.loads(line)))
+                except ValueError:
+                    pass  # torn last line from a crash mid-append
+    return rows
+
+
+def _process_journal_file():
+    base, ext = os.path.splitext(LEDGER_JOURNAL)
+    return f"{base}.{os.getpid()}{ext}"
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # already gone, or (on Windows) just opened by another process that will remove it instead
+
+
+class LedgerWriter:
+    def __init__(self, flush_count=LEDGER_FLUSH_COUNT, flush_seconds=LEDGER_FLUSH_SECONDS,
+                 mirror_excel=LEDGER_MIRROR_EXCEL, journal_file=None):
+        self.flush_count = flush_count
+        self.flush_seconds = flush_seconds
+        self.mirror_excel = mirror_excel
+        # A journal of its own, so a CLI run flushing next to the GUI never truncates the GUI's unflushed rows
+        self.journal_file = journal_file or _process_journal_file()
+        self._journal_lock = try_lock_file(self.journal_file + ".lock")
+        self._pending = []
+        self._unmirrored = []
+        self._timer = None
+        self._lock = threading.RLock()
+        self._mirror_lock = threading.Lock()
+        self.replay_journal()
+
+    def add(self, info, qr_path):
+        self.add_rows([_ledger_row(info, qr_path, datetime.datetime.now().isoformat())])
+
+    def add_rows(self, rows):
+        with self._lock:
+            self._check_new_ids(rows)
+            # Journal first: once add() returns the registration survives a crash before the next flush
+            self._append_journal(rows)
+            self._pending.extend(rows)
+            flush_now = len(self._pending) >= self.flush_count
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def _check_new_ids(self, rows):
+        # Refused here, where the registration can report it as a failed stage, rather than at the next flush
+        counts = Counter(row[0] for row in rows)
+        taken = {i for i, n in counts.items() if n > 1} | (counts.keys() & self.pending_ids())
+        with closing(open_ledger()) as conn:
+            taken.update(i for i in counts
+                         if conn.execute("SELECT 1 FROM patients WHERE patient_id = ?", (i,)).fetchone())
+        if taken:
+            raise ValueError(f"patient ID {min(taken)} is already in the ledger")
+
+    def pending_ids(self):
+        with self._lock:
+            return {row[0] for row in self._pending}
+
+    def pending_rows(self):
+        # Rows added but not yet committed, oldest first: lookups check these in memory rather than forcing a flush
+        with self._lock:
+            return list(self._pending)
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            inserted = []
+            if self._pending:
+                rows, self._pending = self._pending, []
+                try:
+                    try:
+                        inserted = _commit_rows(rows)
+                    except sqlite3.IntegrityError:
+                        inserted = self._commit_each(rows)
+                except Exception:
+                    self._pending = rows + self._pending
+                    raise
+                self._truncate_journal()
+        self._mirror(inserted)  # outside the lock, so pending_rows() never waits for the workbooks
+        return len(inserted)
+
+    def _mirror(self, rows):
+        # Runs only after the rows are committed, so a workbook that cannot be saved (open in Excel, say) is retried
+        # at the next flush and never sends rows back to the ledger
+        if not self.mirror_excel:
+            return
+        with self._mirror_lock:
+            self._unmirrored.extend(rows)
+            if not self._unmirrored:
+                return
+            try:
+                mirror_rows_to_excel(self._unmirrored)
+            except Exception as e:
+                print(f"Failed to update the Excel copy of the ledger, will retry at the next flush: {e}")
+                return
+            self._unmirrored = []
+
+    def _commit_each(self, rows):
+        # Another process took one of these IDs after add() checked it: keep the other rows, set the clashes aside
+        inserted = []
+        for row in rows:
+            try:
+                inserted += _commit_rows([row])
+            except sqlite3.IntegrityError:
+                print(f"Patient {row[0]} ({row[1]}) was not added to the ledger: the ID is already registered. "
+                      f"The row was kept in {LEDGER_REJECTS}")
+                with open(LEDGER_REJECTS, "a") as f:
+                    f.write(json.dumps(list(row)) + "\n")
+        return inserted
+
+    def replay_journal(self):
+        # Replays this process's journal and those of processes that exited (or crashed) before flushing.
+        # A journal whose lock file is still held belongs to a running process and is left alone.
+        replayed = 0
+        base, ext = os.path.splitext(LEDGER_JOURNAL)
+        with self._lock:
+            for path in glob.glob(glob.escape(base) + "*" + ext):
+                if os.path.abspath(path) == os.path.abspath(self.journal_file):
+                    continue
+                lock = try_lock_file(path + ".lock")
+                if lock is None:
+                    continue
+                try:
+                    rows = _read_journal(path)
+                    if rows:
+                        self._mirror(_commit_rows(rows, ignore_existing=True))
+                    os.remove(path)
+                    replayed += len(rows)
+                finally:
+                    unlock_file(lock)
+                _remove_quietly(path + ".lock")
+            rows = _read_journal(self.journal_file)
+            inserted = _commit_rows(rows, ignore_existing=True) if rows else []
+            self._truncate_journal()
+            self._mirror(inserted)
+        return replayed + len(rows)
+
+    def close(self):
+        # Flushes and, once nothing is left to replay, removes this process's journal and releases its lock
+        with self._lock:
+            self.flush()
+            _remove_quietly(self.journal_file)
+            if self._journal_lock is not None:
+                unlock_file(self._journal_lock)
+                self._journal_lock = None
+                _remove_quietly(self.journal_file + ".lock")
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Failed to flush patient ledger: {e}")
+
+    def _append_journal(self, rows):
+        with open(self.journal_file, "a") as f:
+            for row in rows:
+                f.write(json.dumps(list(row)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _truncate_journal(self):
+        if os.path.exists(self.journal_file):
+            open(self.journal_file, "w").close()
+
+
+def get_ledger_writer():
+    global _ledger_writer
+    if _ledger_writer is None:
+        _ledger_writer = LedgerWriter()
+        atexit.register(_ledger_writer.close)
+    return _ledger_writer
+
+
+def write_to_ledger(info, qr_path):
+    get_ledger_writer().add(info, qr_path)
+
+
+def _export_query_to_xlsx(conn, path, sheet_title, headers, query):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_title)
+    ws.append(headers)
+    for row in conn.execute(query):
+        ws.append(list(row))
+    # Save next to the target and swap in, so a failed export never truncates the previous spreadsheet
+    tmp_path = path + ".tmp.xlsx"
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def export_ledger_to_excel():
+    get_ledger_writer().flush()
+    os.makedirs(os.path.dirname(EXCEL_FILE), exist_ok=True)
+    os.makedirs(os.path.dirname(PICTURES_EXCEL), exist_ok=True)
+    with closing(open_ledger()) as conn:
+        _export_query_to_xlsx(conn, EXCEL_FILE, "Sheet", EXCEL_HEADERS,
+                              "SELECT patient_id, name, dob, age, gender, care_of, phone, qr_path, registration_date, "
+                              "timestamp FROM patients ORDER BY rowid")
+        _export_query_to_xlsx(conn, PICTURES_EXCEL, "Patient Data Pictures", PICTURES_HEADERS,
+                              "SELECT patient_id, name, dob, age, gender, care_of, phone, registration_date, "
+                              "timestamp FROM patients ORDER BY rowid")
+    return EXCEL_FILE, PICTURES_EXCEL
@@ -0,0 +1,76 @@
+import io
+import os
+
+from .config import SHEET_DPI, PDF_JPEG_QUALITY
+
+
+class PdfWriter:
+    # Minimal PDF writer that streams each page (one full-page JPEG) to disk as soon as it is added, so documents
+    # of any length only ever hold a single page image in memory. The file appears under its name on close().
+    def __init__(self, path, dpi=SHEET_DPI, jpeg_quality=PDF_JPEG_QUALITY):
+        self.path = path
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self.page_count = 0
+        self._tmp_path = path + ".tmp"
+        self._f = open(self._tmp_path, "wb")
+        self._offsets = {}
+        self._page_objects = []
+        self._next_object = 3  # 1 is the catalog and 2 the page tree, both written on close()
+        self._f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_page(self, image):
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buf = io.BytesIO()
+        image.save(buf, "JPEG", quality=self.jpeg_quality, dpi=(self.dpi, self.dpi))
+        width_pt = image.width * 72.0 / self.dpi
+        height_pt = image.height * 72.0 / self.dpi
+        image_obj, content_obj, page_obj = range(self._next_object, self._next_object + 3)
+        self._next_object += 3
+        colour_space = b"/DeviceGray" if image.mode == "L" else b"/DeviceRGB"
+        self._write_object(image_obj, b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s "
+                                      b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>"
+                           % (image.width, image.height, colour_space, buf.tell()), buf.getvalue())
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (width_pt, height_pt)
+        self._write_object(content_obj, b"<< /Length %d >>" % len(content), content)
+        self._write_object(page_obj, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+                                     b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+                           % (width_pt, height_pt, image_obj, content_obj))
+        self._page_objects.append(page_obj)
+        self.page_count += 1
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % n for n in self._page_objects)
+        self._write_object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._page_objects)))
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref_offset = self._f.tell()
+        self._f.write(b"xref\n0 %d\n0000000000 65535 f \n" % self._next_object)
+        for num in range(1, self._next_object):
+            self._f.write(b"%010d 00000 n \n" % self._offsets[num])
+        self._f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (self._next_object, xref_offset))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def _write_object(self, num, header, stream=None):
+        self._offsets[num] = self._f.tell()
+        self._f.write(b"%d 0 obj\n" % num + header)
+        if stream is not None:
+            self._f.write(b"\nstream\n" + stream + b"\nendstream")
+        self._f.write(b"\nendobj\n")
@@ -0,0 +1,207 @@
+import os
+import json
+import shlex
+import platform
+import datetime
+import threading
+import subprocess
+
+from PIL import Image
+
+from .config import (PRINT_QUEUE_FILE, PRINT_COMMAND, PRINT_TIMEOUT_SECONDS, PRINT_MAX_ATTEMPTS, PRINT_RETRY_SECONDS,
+                     PRINT_HOLD_FOR_SHEETS, PRINT_BATCH_DIR, PRINT_OUTPUT_PROFILE)
+from .imposition import impose_cards_to_pdf
+from .cards import output_profile, save_card_image
+
+_print_spooler = None
+
+
+def send_to_printer(image_path, command=PRINT_COMMAND):
+    # Hands one file to the local spooler (or the configured stand-in command); raises if that fails
+    if command:
+        args = shlex.split(command, posix=os.name != "nt")
+        if os.name == "nt":
+            # Non-POSIX splitting keeps backslashes in paths but also the quotes around "C:\Program Files\..." tokens,
+            # which subprocess would quote again
+            args = [a[1:-1] if len(a) > 1 and a[0] == a[-1] == '"' else a for a in args]
+        if any("{file}" in a for a in args):
+            args = [a.replace("{file}", image_path) for a in args]
+        else:
+            args.append(image_path)
+    elif platform.system() == "Windows":
+        os.startfile(image_path, "print")
+        return
+    else:
+        args = ["lp", image_path]
+    result = subprocess.run(args, capture_output=True, text=True, timeout=PRINT_TIMEOUT_SECONDS)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"{args[0]} exited with status {result.returncode}")
+
+
+class PrintSpooler:
+    def __init__(self, queue_file=PRINT_QUEUE_FILE, command=PRINT_COMMAND, max_attempts=PRINT_MAX_ATTEMPTS,
+                 retry_seconds=PRINT_RETRY_SECONDS, hold=PRINT_HOLD_FOR_SHEETS, batch_dir=PRINT_BATCH_DIR):
+        self.queue_file = queue_file
+        self.command = command
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.hold = hold
+        self.batch_dir = batch_dir
+        self._jobs = []
+        self._next_id = 1
+        self._wakeup = threading.Condition()
+        self._worker = None
+        self.save_error = ""
+        self._load_queue()
+
+    def submit(self, image_path):
+        with self._wakeup:
+            job = {"id": self._next_id, "path": image_path, "attempts": 0, "state": "held" if self.hold else "pending",
+                   "error": "", "next_try": 0, "queued": datetime.datetime.now().isoformat()}
+            return self._add_job(job)
+
+    def release_held(self, per_sheet=4, cut_marks=True):
+        # Replaces every held card with one job that imposes them per_sheet-up onto A4 pages of a single PDF
+        with self._wakeup:
+            held = [job for job in self._jobs if job["state"] == "held"]
+            if not held:
+                return None
+            for job in held:
+                self._jobs.remove(job)
+            stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            job = {"id": self._next_id, "path": os.path.join(self.batch_dir, f"sheets_{stamp}_{self._next_id}.pdf"),
+                   "cards": [j["path"] for j in held], "per_sheet": per_sheet, "cut_marks": cut_marks, "attempts": 0,
+                   "state": "pending", "error": "", "next_try": 0, "queued": datetime.datetime.now().isoformat()}
+            return self._add_job(job)
+
+    def start(self):
+        with self._wakeup:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def retry_failed(self):
+        with self._wakeup:
+            for job in self._jobs:
+                if job["state"] == "failed":
+                    job.update(state="pending", attempts=0, next_try=0)
+            self._save_queue()
+            self._wakeup.notify()
+
+    def status(self):
+        with self._wakeup:
+            failed = [job for job in self._jobs if job["state"] == "failed"]
+            held = [job for job in self._jobs if job["state"] == "held"]
+            return {"pending": len(self._jobs) - len(failed) - len(held), "failed": len(failed), "held": len(held),
+                    "last_error": failed[-1]["error"] if failed else "", "save_error": self.save_error}
+
+    def jobs(self):
+        with self._wakeup:
+            return [dict(job) for job in self._jobs]
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                job = self._next_due_job()
+                while job is None:
+                    waiting = [j["next_try"] for j in self._jobs if j["state"] == "pending"]
+                    if self.save_error:
+                        waiting.append(datetime.datetime.now().timestamp() + self.retry_seconds)
+                    self._wakeup.wait(max(0.0, min(waiting) - datetime.datetime.now().timestamp()) if waiting else None)
+                    if self.save_error:
+                        self._save_queue_from_worker()
+                    job = self._next_due_job()
+                path = job["path"]
+                sheet_cards = job.get("cards")
+            try:
+                if sheet_cards and not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    impose_cards_to_pdf(sheet_cards, path, job["per_sheet"], job["cut_marks"])
+                send_to_printer(path, self.command)
+                error = None
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            with self._wakeup:
+                if error is None:
+                    self._jobs.remove(job)
+                else:
+                    job["attempts"] += 1
+                    job["error"] = error
+                    if job["attempts"] >= self.max_attempts:
+                        job["state"] = "failed"
+                        print(f"Failed to print {path}: {error}")
+                    else:
+                        job["next_try"] = datetime.datetime.now().timestamp() + self.retry_seconds * 2 ** (job["attempts"] - 1)
+                self._save_queue_from_worker()
+
+    def _add_job(self, job):
+        self._next_id += 1
+        # Persisted before submit() returns, so a restart still prints it
+        self._jobs.append(job)
+        self._save_queue()
+        self._wakeup.notify()
+        return job["id"]
+
+    def _next_due_job(self):
+        now = datetime.datetime.now().timestamp()
+        return next((job for job in self._jobs if job["state"] == "pending" and job["next_try"] <= now), None)
+
+    def _load_queue(self):
+        try:
+            with open(self.queue_file) as f:
+                self._jobs = json.load(f)
+        except FileNotFoundError:
+            self._jobs = []
+        except ValueError as e:
+            print(f"Ignoring unreadable print queue {self.queue_file}: {e}")
+            self._jobs = []
+        for job in self._jobs:
+            job["next_try"] = 0
+        self._next_id = max((job["id"] for job in self._jobs), default=0) + 1
+
+    def _save_queue(self):
+        tmp_file = self.queue_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self._jobs, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.queue_file)
+        self.save_error = ""
+
+    def _save_queue_from_worker(self):
+        # A full disk or a queue file held open elsewhere must not end the worker: the jobs stay in memory and the save
+        # is retried every retry_seconds until it succeeds
+        try:
+            self._save_queue()
+        except OSError as e:
+            if not self.save_error:
+                print(f"Failed to save print queue {self.queue_file}: {e}")
+            self.save_error = f"queue not saved: {e}"
+
+
+def get_print_spooler():
+    global _print_spooler
+    if _print_spooler is None:
+        _print_spooler = PrintSpooler()
+        _print_spooler.start()
+    return _print_spooler
+
+
+def print_image_default(image_path):
+    # Queues the card and returns at once; the spooler's worker sends it to the printer and retries failures
+    return get_print_spooler().submit(image_path)
+
+
+def print_card(patient_id, card_path, card=None):
+    # Queues a patient's card, converted first when PRINT_OUTPUT_PROFILE is set (e.g. a 1-bit copy for a thermal
+    # printer, kept apart from the card in gen_id/). Pass the rendered card if there is one, to skip reading it back.
+    path = card_path
+    if PRINT_OUTPUT_PROFILE:
+        os.makedirs(PRINT_BATCH_DIR, exist_ok=True)
+        path = os.path.join(PRINT_BATCH_DIR, patient_id + output_profile(PRINT_OUTPUT_PROFILE)[1])
+        if card is None:
+            with Image.open(card_path) as src:
+                save_card_image(src, path, PRINT_OUTPUT_PROFILE)
+        else:
+            save_card_image(card, path, PRINT_OUTPUT_PROFILE)
+    return print_image_default(path)
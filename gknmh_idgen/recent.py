@@ -0,0 +1,106 @@
+import os
+import json
+import threading
+from collections import deque
+from contextlib import closing
+
+from .config import RECENT_CARDS_FILE, RECENT_CARDS_LIMIT
+from .ledger import open_ledger
+from .storage import card_file_path, find_card_file
+from .system import lock_file, unlock_file
+
+_recent_cards = None
+_recent_cards_lock = threading.Lock()
+
+
+class RecentCards:
+    def __init__(self, index_file=RECENT_CARDS_FILE, limit=RECENT_CARDS_LIMIT):
+        self.index_file = index_file
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=limit)  # newest first
+        if not self._load_index():
+            self._seed_from_ledger()
+
+    def add(self, info, card_path):
+        self.add_many([(info, card_path)])
+
+    def add_many(self, cards):
+        added = [{"id": info["id"], "name": info["name"], "registration_date": info["registration_date"],
+                  "path": card_path} for info, card_path in reversed(cards)]
+        with self._lock:
+            lock = lock_file(self.index_file + ".lock")
+            try:
+                # The GUI and a --batch run share the index: start from what is on disk now, not from this process's
+                # copy, so neither drops the other's cards
+                on_disk = self._read_index()
+                self._set_entries(added + (on_disk if on_disk is not None else list(self._entries)))
+                self._save_index()
+            finally:
+                unlock_file(lock)
+
+    def latest(self):
+        with self._lock:
+            return dict(self._entries[0]) if self._entries else None
+
+    def entries(self, count=None):
+        with self._lock:
+            return [dict(entry) for entry, _ in zip(self._entries, range(count or self.limit))]
+
+    def _load_index(self):
+        entries = self._read_index()
+        if entries is None:
+            return False
+        self._set_entries(entries)
+        return True
+
+    def _read_index(self):
+        try:
+            with open(self.index_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"Rebuilding unreadable recent cards index {self.index_file}: {e}")
+            return None
+
+    def _set_entries(self, entries):
+        seen = set()
+        self._entries.clear()
+        for entry in entries:
+            if entry["id"] not in seen and len(self._entries) < self.limit:
+                seen.add(entry["id"])
+                self._entries.append(entry)
+
+    def _seed_from_ledger(self):
+        # First run (or lost index): the newest ledger rows, by insertion order, stand in for the missing history
+        with closing(open_ledger()) as conn:
+            rows = conn.execute("SELECT patient_id, name, registration_date FROM patients ORDER BY rowid DESC LIMIT ?",
+                                (self.limit,)).fetchall()
+        for patient_id, name, registration_date in rows:
+            path = (find_card_file(patient_id, registration_date)
+                    or card_file_path(patient_id, registration_date, create=False))
+            self._entries.append({"id": patient_id, "name": name, "registration_date": registration_date, "path": path})
+        lock = lock_file(self.index_file + ".lock")
+        try:
+            on_disk = self._read_index()  # another process may have written the index in the meantime
+            if on_disk is None:
+                self._save_index()
+            else:
+                self._set_entries(on_disk)
+        finally:
+            unlock_file(lock)
+
+    def _save_index(self):
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(list(self._entries), f, indent=1)
+        os.replace(tmp_file, self.index_file)
+
+
+def get_recent_cards():
+    global _recent_cards
+    with _recent_cards_lock:
+        if _recent_cards is None:
+            _recent_cards = RecentCards()
+        return _recent_cards
@@ -0,0 +1,110 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .config import (PICTURES_SUBDIR, SAVE_QR_FILES, REGISTRATION_STAGE_WORKERS, CARD_OUTPUT_PROFILE,
+                     PICTURES_OUTPUT_PROFILE)
+from .ids import generate_patient_id
+from .validation import calculate_age
+from .cards import cached_qr_code, create_patient_id_card, output_profile, save_card_image
+from .ledger import write_to_ledger
+from .printing import print_card
+from .recent import get_recent_cards
+from .storage import card_file_path
+
+_stage_executor = ThreadPoolExecutor(max_workers=REGISTRATION_STAGE_WORKERS)
+
+
+def _stage_qr(ctx):
+    return cached_qr_code(ctx["info"]["id"], ctx["qr_filename"])
+
+
+def _stage_card(ctx):
+    return create_patient_id_card(ctx["info"], ctx["qr"])
+
+
+def _stage_card_file(ctx):
+    save_card_image(ctx["card"], ctx["output_filename"], CARD_OUTPUT_PROFILE)
+
+
+def _stage_pictures_copy(ctx):
+    # Encoded straight from the rendered card, so it does not wait for the card file to hit the disk
+    info = ctx["info"]
+    path = card_file_path(info["id"], info["registration_date"], PICTURES_SUBDIR,
+                          suffix=output_profile(PICTURES_OUTPUT_PROFILE)[1])
+    save_card_image(ctx["card"], path, PICTURES_OUTPUT_PROFILE)
+
+
+def _stage_ledger(ctx):
+    write_to_ledger(ctx["info"], ctx["qr_filename"])
+
+
+def _stage_print(ctx):
+    print_card(ctx["info"]["id"], ctx["output_filename"], ctx["card"])
+
+
+def _stage_recent(ctx):
+    get_recent_cards().add(ctx["info"], ctx["output_filename"])
+
+
+# (stage, stages it needs, function). Each stage's return value is stored in the context under its own name.
+REGISTRATION_STAGES = [
+    ("qr", [], _stage_qr),
+    ("card", ["qr"], _stage_card),
+    ("card_file", ["card"], _stage_card_file),
+    ("pictures_copy", ["card"], _stage_pictures_copy),
+    ("ledger", [], _stage_ledger),
+    ("print", ["card_file"], _stage_print),
+    ("recent", ["card_file"], _stage_recent),
+]
+
+
+def run_stages(stages, ctx):
+    # Starts every stage as soon as the stages it needs have finished; a failed stage skips everything that needs it.
+    # Returns {stage: error message} for the stages that failed or were skipped.
+    pending = {name: (needs, fn) for name, needs, fn in stages}
+    running = {}
+    errors = {}
+    while pending or running:
+        for name, (needs, fn) in list(pending.items()):
+            failed = [n for n in needs if n in errors]
+            if failed:
+                errors[name] = f"skipped because {failed[0]} failed"
+                del pending[name]
+            elif all(n in ctx for n in needs):
+                running[_stage_executor.submit(fn, ctx)] = name
+                del pending[name]
+        if not running:
+            for name in pending:
+                errors[name] = "skipped because a stage it needs never ran"
+            break
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = running.pop(future)
+            try:
+                ctx[name] = future.result()
+            except Exception as e:
+                errors[name] = str(e)
+    return errors
+
+
+def register_patient(name, dob, gender, care_of, phone):
+    # Fields must already have passed patient_field_errors(). Returns the card info, the card file path and
+    # {stage: error message} for any registration stage that did not complete.
+    reg_date = datetime.datetime.today().strftime("%d-%m-%Y")
+    age = calculate_age(dob, reg_date)
+    patient_id = generate_patient_id()
+    output_filename = card_file_path(patient_id, reg_date, suffix=output_profile(CARD_OUTPUT_PROFILE)[1])
+    patient_info = {
+        "id": patient_id, "name": name, "dob": dob, "age": age,
+        "gender": gender, "care_of": care_of, "phone": phone,
+        "registration_date": reg_date
+    }
+    ctx = {
+        "info": patient_info,
+        "qr_filename": card_file_path(patient_id, reg_date, suffix="_qr.png") if SAVE_QR_FILES else "",
+        "output_filename": output_filename,
+    }
+    stage_errors = run_stages(REGISTRATION_STAGES, ctx)
+    for stage, error in stage_errors.items():
+        print(f"Registration of {patient_id}, {stage} stage: {error}")
+    return patient_info, output_filename, stage_errors
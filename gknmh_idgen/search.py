@@ -0,0 +1,140 @@
+import re
+import difflib
+from contextlib import closing
+
+from .config import (ID_PREFIX, SEARCH_RESULT_LIMIT, SEARCH_MIN_PHONE_DIGITS, SEARCH_FUZZY_CUTOFF, SEARCH_FUZZY_WORDS,
+                     CARD_OUTPUT_PROFILE)
+from .ids import patient_number
+from .validation import normalize_name, normalize_phone
+from .ledger import open_ledger, get_ledger_writer
+from .cards import cached_qr_code, create_patient_id_card, output_profile, save_card_image
+from .storage import card_file_path, find_card_file
+from .printing import print_card
+
+PATIENT_COLUMNS = ["id", "name", "dob", "age", "gender", "care_of", "phone", "registration_date"]
+_PATIENT_SELECT = "SELECT patient_id, name, dob, age, gender, care_of, phone, registration_date FROM patients"
+
+
+def _prefix_range(prefix):
+    # [low, high) bounds that let an index answer "starts with prefix" (LIKE would not use it)
+    return prefix, prefix + "\U0010ffff"
+
+
+def _patients(conn, where, params, match, limit):
+    rows = conn.execute(f"{_PATIENT_SELECT} WHERE {where} ORDER BY rowid DESC LIMIT ?", list(params) + [limit])
+    return [dict(zip(PATIENT_COLUMNS, row), match=match) for row in rows]
+
+
+def _name_matches(conn, words, limit):
+    # Every word of the query must start a word of the name, in any order: "kum ra" finds "Ravi Kumar"
+    where = " AND ".join(["patient_id IN (SELECT patient_id FROM name_words WHERE word >= ? AND word < ?)"] * len(words))
+    return _patients(conn, where, [bound for word in words for bound in _prefix_range(word)], "name", limit)
+
+
+def _fuzzy_name_matches(conn, words, limit):
+    # Typos: each query word may instead equal an indexed word that is close to it. Only words with the same
+    # first letter and a similar length are compared, so the candidate list stays small at any ledger size.
+    where, params = [], []
+    for word in words:
+        candidates = [w for (w,) in conn.execute(
+            "SELECT DISTINCT word FROM name_words WHERE word >= ? AND word < ? AND length(word) BETWEEN ? AND ?",
+            _prefix_range(word[0]) + (len(word) - 2, len(word) + 2))]
+        close = difflib.get_close_matches(word, candidates, SEARCH_FUZZY_WORDS, SEARCH_FUZZY_CUTOFF)
+        if not close:
+            return []
+        where.append(f"patient_id IN (SELECT patient_id FROM name_words WHERE word IN ({', '.join('?' * len(close))}))")
+        params.extend(close)
+    return _patients(conn, " AND ".join(where), params, "similar name", limit)
+
+
+def search_patients(query, limit=SEARCH_RESULT_LIMIT):
+    # Exact patient ID (or just its number), phone number prefix, or name: word prefixes first, similar names when
+    # nothing starts with the words typed. Returns patient dicts, newest registration first within each kind of match,
+    # each with "match" saying how it was found.
+    text = (query or "").strip()
+    if not text:
+        return []
+    pending = get_ledger_writer().pending_rows()  # read first: a row flushed meanwhile is found twice, never missed
+    results = []
+    with closing(open_ledger()) as conn:
+        if text.upper().startswith(ID_PREFIX) or text.isdigit():
+            try:
+                patient_id = f"{ID_PREFIX}{patient_number(text)}"
+                results += (_pending_patients(pending, "ID", lambda row: row[0] == patient_id)
+                            or _patients(conn, "patient_id = ?", [patient_id], "ID", 1))
+            except ValueError:
+                pass
+        if re.fullmatch(r"[\d\s()+-]+", text):
+            digits = normalize_phone(text)
+            if len(digits) >= SEARCH_MIN_PHONE_DIGITS:
+                results += _pending_patients(pending, "phone", lambda row: normalize_phone(row[6]).startswith(digits))
+                results += _patients(conn, "phone_norm >= ? AND phone_norm < ?", _prefix_range(digits), "phone", limit)
+        else:
+            words = normalize_name(text).split()
+            if words:
+                name_results = _pending_patients(pending, "name",
+                                                 lambda row: _starts_words(normalize_name(row[1]), words))
+                name_results += _name_matches(conn, words, limit)
+                results += name_results or _fuzzy_name_matches(conn, words, limit)
+    return _unique(results)[:limit]
+
+
+def _starts_words(name_norm, words):
+    # The in-memory form of _name_matches()
+    name_words = name_norm.split()
+    return all(any(name_word.startswith(word) for name_word in name_words) for word in words)
+
+
+def _pending_patients(rows, match, test):
+    # Registrations still waiting for the writer's group commit, newest first: checked in memory so a lookup on the
+    # Tk thread never has to flush them (and mirror the workbooks) itself
+    return [dict(zip(PATIENT_COLUMNS, row[:7] + row[8:9]), match=match) for row in reversed(rows) if test(row)]
+
+
+def _unique(patients):
+    seen = set()
+    unique = []
+    for patient in patients:
+        if patient["id"] not in seen:
+            seen.add(patient["id"])
+            unique.append(patient)
+    return unique
+
+
+def find_duplicate_patients(name, dob, phone):
+    # Patients already in the ledger who are probably the person about to be registered: same phone number and
+    # date of birth, or same normalised name and date of birth. Two index lookups, whatever the size of the ledger.
+    pending = get_ledger_writer().pending_rows()  # a registration from a moment ago must count too
+    with closing(open_ledger()) as conn:
+        results = []
+        phone_norm = normalize_phone(phone)
+        if phone_norm:
+            results += _pending_patients(pending, "phone and date of birth",
+                                         lambda row: row[2] == dob and normalize_phone(row[6]) == phone_norm)
+            results += _patients(conn, "phone_norm = ? AND dob = ?", [phone_norm, dob], "phone and date of birth",
+                                 SEARCH_RESULT_LIMIT)
+        name_norm = normalize_name(name)
+        if name_norm:
+            results += _pending_patients(pending, "name and date of birth",
+                                         lambda row: row[2] == dob and normalize_name(row[1]) == name_norm)
+            results += _patients(conn, "name_norm = ? AND dob = ?", [name_norm, dob], "name and date of birth",
+                                 SEARCH_RESULT_LIMIT)
+    return _unique(results)
+
+
+def patient_card_file(patient):
+    # The existing card, or (when it was deleted or never copied to this desk) one re-rendered from the ledger
+    path = find_card_file(patient["id"], patient["registration_date"])
+    if path:
+        return path
+    path = card_file_path(patient["id"], patient["registration_date"], suffix=output_profile(CARD_OUTPUT_PROFILE)[1])
+    info = {key: "" if patient[key] is None else patient[key] for key in PATIENT_COLUMNS}
+    save_card_image(create_patient_id_card(info, cached_qr_code(patient["id"])), path, CARD_OUTPUT_PROFILE)
+    return path
+
+
+def reprint_patient_card(patient):
+    # A returning patient keeps their ID: their card goes back through the print queue instead of a new registration
+    path = patient_card_file(patient)
+    print_card(patient["id"], path)
+    return path
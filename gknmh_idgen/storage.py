@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import datetime
+import argparse
+from contextlib import closing
+
+from .config import (ID_OUTPUT_DIR, PICTURES_SUBDIR, ID_PREFIX, CARD_LAYOUT, CARD_LAYOUTS, CARD_SHARD_SIZE,
+                     RECENT_CARDS_FILE, PRINT_QUEUE_FILE, OUTPUT_PROFILES, CARD_OUTPUT_PROFILE)
+from .auth import command_line_login
+from .ids import patient_number
+from .ledger import open_ledger, get_ledger_writer
+from .workspace import setup_dirs_and_files
+
+# <ID>.png, <ID>_qr.png: the files a patient has in gen_id/ and the Pictures mirror
+CARD_FILE_PATTERN = re.compile(rf"^(?P<id>{re.escape(ID_PREFIX)}\d+)(?P<suffix>_qr)?\.(png|jpg|jpeg|webp)$",
+                               re.IGNORECASE)
+
+
+def card_shard(patient_id, registration_date, layout=CARD_LAYOUT):
+    # Sub-folder (relative to gen_id/ or the Pictures mirror) that holds this patient's files
+    if layout == "flat":
+        return ""
+    if layout == "id":
+        try:
+            first = patient_number(patient_id) // CARD_SHARD_SIZE * CARD_SHARD_SIZE
+        except ValueError:
+            return "other"
+        return f"{first:07d}-{first + CARD_SHARD_SIZE - 1:07d}"
+    if layout == "month":
+        try:
+            date = datetime.datetime.strptime(registration_date, "%d-%m-%Y")
+        except (TypeError, ValueError):
+            return "undated"
+        return os.path.join(f"{date:%Y}", f"{date:%m}")
+    raise ValueError(f"Unknown card layout {layout!r}; expected one of {', '.join(CARD_LAYOUTS)}")
+
+
+def card_file_path(patient_id, registration_date, root=ID_OUTPUT_DIR, suffix=".png", layout=CARD_LAYOUT, create=True):
+    # Where a card (or, with suffix="_qr.png", its QR) is written; every writer goes through here
+    folder = os.path.join(root, card_shard(patient_id, registration_date, layout))
+    if create:
+        os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{patient_id}{suffix}")
+
+
+def find_card_file(patient_id, registration_date=None, root=ID_OUTPUT_DIR, suffix=None):
+    # Every reader goes through here: the configured layout first, then the others, so cards written before a
+    # layout change are still found until the migration has moved them. Without a suffix, a card saved under
+    # any output profile's extension is found, the card profile's own extension first.
+    suffixes = [suffix] if suffix else list(dict.fromkeys(
+        [OUTPUT_PROFILES[CARD_OUTPUT_PROFILE][1]] + [profile[1] for profile in OUTPUT_PROFILES.values()]))
+    for layout in [CARD_LAYOUT] + [l for l in CARD_LAYOUTS if l != CARD_LAYOUT]:
+        for suffix in suffixes:
+            path = card_file_path(patient_id, registration_date, root, suffix, layout, create=False)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def _walk_files(root):
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def _remove_empty_dirs(root):
+    for folder, _, _ in sorted(os.walk(root), key=lambda item: -len(item[0])):
+        if folder != root:
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass  # not empty
+
+
+def _rewrite_index_paths(index_file, moved):
+    # The recent-cards index and the print queue remember card paths; point them at the new locations
+    if not moved or not os.path.exists(index_file):
+        return
+    with open(index_file) as f:
+        entries = json.load(f)
+    for entry in entries:
+        if entry.get("path") in moved:
+            entry["path"] = moved[entry["path"]]
+        if "cards" in entry:
+            entry["cards"] = [moved.get(path, path) for path in entry["cards"]]
+    tmp_file = index_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(entries, f, indent=1)
+    os.replace(tmp_file, index_file)
+
+
+def migrate_card_layout(layout=CARD_LAYOUT, roots=(ID_OUTPUT_DIR, PICTURES_SUBDIR), dry_run=False):
+    # Moves every card/QR file under roots into `layout`. Registration dates come from the ledger; files of
+    # patients the ledger does not know are dated by their modification time. Returns (moved, kept, conflicts).
+    card_shard("", None, layout)  # reject an unknown layout before touching anything
+    get_ledger_writer().flush()
+    with closing(open_ledger()) as conn:
+        registration_dates = dict(conn.execute("SELECT patient_id, registration_date FROM patients"))
+    moved, kept, conflicts = {}, 0, []
+    for root in roots:
+        if not os.path.isdir(root):
+            continue
+        for entry in list(_walk_files(root)):
+            match = CARD_FILE_PATTERN.match(entry.name)
+            if not match:
+                continue  # e.g. the Pictures spreadsheet
+            patient_id = match.group("id")
+            registration_date = registration_dates.get(patient_id) or datetime.datetime.fromtimestamp(
+                entry.stat().st_mtime).strftime("%d-%m-%Y")
+            target = os.path.join(root, card_shard(patient_id, registration_date, layout), entry.name)
+            if os.path.normcase(os.path.abspath(target)) == os.path.normcase(os.path.abspath(entry.path)):
+                kept += 1
+            elif os.path.exists(target):
+                conflicts.append(entry.path)
+            else:
+                if not dry_run:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(entry.path, target)
+                moved[entry.path] = target
+        if not dry_run:
+            _remove_empty_dirs(root)
+    if not dry_run:
+        _rewrite_index_paths(RECENT_CARDS_FILE, moved)
+        _rewrite_index_paths(PRINT_QUEUE_FILE, moved)
+    return len(moved), kept, conflicts
+
+
+def migrate_main(argv):
+    parser = argparse.ArgumentParser(description="Move existing ID cards into the configured sub-folder layout.")
+    parser.add_argument("--migrate-layout", action="store_true", required=True)
+    parser.add_argument("--layout", choices=CARD_LAYOUTS, default=CARD_LAYOUT,
+                        help=f"target layout (default: GKNMH_CARD_LAYOUT or {CARD_LAYOUT!r})")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be moved")
+    args = parser.parse_args(argv)
+    if args.layout != CARD_LAYOUT and not args.dry_run:
+        print(f"Note: new cards will still be written in the {CARD_LAYOUT!r} layout "
+              f"until GKNMH_CARD_LAYOUT is set to {args.layout!r}.")
+
+    setup_dirs_and_files()
+    if not command_line_login("Migration"):
+        return 1
+    moved, kept, conflicts = migrate_card_layout(args.layout, dry_run=args.dry_run)
+    print(f"{moved} files {'would be ' if args.dry_run else ''}moved, {kept} already in place, "
+          f"{len(conflicts)} left where they are because the target already exists")
+    for path in conflicts:
+        print(f"  conflict: {path}")
+    return 1 if conflicts else 0
@@ -0,0 +1,75 @@
+import os
+import time
+import platform
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def open_image_default_viewer(image_path):
+    try:
+        if platform.system() == "Windows":
+            os.startfile(image_path)
+        elif platform.system() == "Darwin":
+            subprocess.call(["open", image_path])
+        else:
+            subprocess.call(["xdg-open", image_path])
+    except Exception as e:
+        print(f"Failed to open image: {e}")
+
+
+def try_lock_file(path):
+    # Non-blocking exclusive lock on `path` (created if needed). Returns a handle for unlock_file(), or None while
+    # another process holds it; the OS drops the lock by itself if the holder dies.
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        if platform.system() == "Windows":
+            import msvcrt
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def lock_file(path, poll_seconds=0.05):
+    # Blocking form of try_lock_file(), for short critical sections shared with other processes
+    while True:
+        fd = try_lock_file(path)
+        if fd is not None:
+            return fd
+        time.sleep(poll_seconds)
+
+
+def unlock_file(fd):
+    os.close(fd)  # closing the descriptor releases the lock on every platform
+
+
+def peak_memory_bytes():
+    # Peak resident memory of this process so far (peak working set on Windows), or None if it cannot be read
+    if platform.system() == "Windows":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                                                     "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                                                     "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024  # bytes on macOS, KiB on Linux
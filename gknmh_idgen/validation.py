@@ -0,0 +1,50 @@
+import re
+import datetime
+import unicodedata
+
+from .config import GENDER_OPTIONS, NAME_TITLES
+
+
+def calculate_age(dob_str, reference_str):
+    try:
+        dob = datetime.datetime.strptime(dob_str, "%d-%m-%Y")
+        ref = datetime.datetime.strptime(reference_str, "%d-%m-%Y")
+        return ref.year - dob.year - ((ref.month, ref.day) < (dob.month, dob.day))
+    except:
+        return ""
+
+
+def validate_date(date_text):
+    try:
+        d = datetime.datetime.strptime(date_text, "%d-%m-%Y")
+        return d <= datetime.datetime.today()
+    except:
+        return False
+
+
+def patient_field_errors(name, dob, gender, phone):
+    errors = {}
+    if not name:
+        errors["name"] = "name is required"
+    if not dob or not validate_date(dob):
+        errors["dob"] = "date of birth must be a past date in dd-mm-yyyy format"
+    if gender not in GENDER_OPTIONS:
+        errors["gender"] = f"gender must be one of {', '.join(GENDER_OPTIONS)}"
+    if not phone.isdigit() or len(phone) != 10:
+        errors["phone"] = "phone must be a 10-digit number"
+    return errors
+
+
+def normalize_name(name):
+    # Lower case without accents, punctuation, repeated spaces or a leading title: " Dr. RAVI  Kumár" -> "ravi kumar"
+    text = unicodedata.normalize("NFKD", name or "")
+    words = re.sub(r"[\W_]+", " ", "".join(c for c in text if not unicodedata.combining(c)).lower()).split()
+    while len(words) > 1 and words[0] in NAME_TITLES:
+        words.pop(0)
+    return " ".join(words)
+
+
+def normalize_phone(phone):
+    # Digits only, without a +91/0 prefix in front of a 10-digit number
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:] if len(digits) > 10 else digits
@@ -0,0 +1,32 @@
+import os
+import datetime
+import subprocess
+from contextlib import closing
+
+from PIL import Image
+
+from .config import BASE_DIR, ID_OUTPUT_DIR, LICENSE_DIR, LOGO_FILE, PICTURES_SUBDIR, ADMIN_FILE, START_DATE_FILE
+from .auth import hash_password
+from .ledger import open_ledger, import_workbook_into_ledger, get_ledger_writer
+
+
+def setup_dirs_and_files():
+    os.makedirs(os.path.join(BASE_DIR, "data_base"), exist_ok=True)
+    os.makedirs(ID_OUTPUT_DIR, exist_ok=True)
+    os.makedirs(LICENSE_DIR, exist_ok=True)
+    os.makedirs(os.path.dirname(LOGO_FILE), exist_ok=True)
+    os.makedirs(PICTURES_SUBDIR, exist_ok=True)
+    with closing(open_ledger()) as conn:
+        if conn.execute("SELECT 1 FROM patients LIMIT 1").fetchone() is None:
+            import_workbook_into_ledger(conn)
+    get_ledger_writer()
+    if not os.path.exists(LOGO_FILE):
+        Image.new("RGB", (600, 200), "gray").save(LOGO_FILE)
+    if not os.path.exists(ADMIN_FILE):
+        with open(ADMIN_FILE, "w") as f:
+            f.write(hash_password("Admin@123"))
+    if not os.path.exists(START_DATE_FILE):
+        with open(START_DATE_FILE, "w") as f:
+            f.write(datetime.datetime.today().strftime("%d-%m-%Y"))
+    if os.name == 'nt':
+        subprocess.call(["attrib", "+h", BASE_DIR])